@@ -0,0 +1,229 @@
+import json
+import math
+import threading
+from pathlib import Path
+
+import numpy as np
+
+import earthquakes
+import quake_stats
+
+# columns with min/max metadata (zone maps) for every chunk
+ZONE_MAP_COLUMNS = ('lat', 'long', 'magnitude', 'time', 'significance', 'depth')
+
+METADATA_FILE = "metadata.json"
+
+
+def write_chunk(directory, index, columns):
+    """
+    This function will write one chunk of columns to disk, each column in its own .npy file
+    :param directory: directory of the chunked catalogue
+    :param index: number of the chunk
+    :param columns: dictionary of column name -> np array (all the QUAKE_COLUMNS)
+    :return: dictionary with the chunk metadata (name, rows and zone map)
+    """
+    name = f"chunk_{index:06d}"
+    chunk_path = Path(directory) / name
+    chunk_path.mkdir(parents=True, exist_ok=True)
+
+    for column, dtype in earthquakes.QUAKE_COLUMNS.items():
+        np.save(chunk_path / f"{column}.npy", np.asarray(columns[column], dtype=dtype))
+
+    # min and max of each zone map column, used to skip chunks. NaN values never pass a filter so they are left out,
+    # a column with only NaN values gets [nan, nan] and rules out the chunk
+    zone_map = {}
+    for column in ZONE_MAP_COLUMNS:
+        values = np.asarray(columns[column])
+        values = values[~np.isnan(values)]
+        zone_map[column] = [values.min().item(), values.max().item()] if len(values) else [math.nan, math.nan]
+
+    return {'name': name, 'rows': len(columns['magnitude']), 'zone_map': zone_map}
+
+
+class ChunkedQuakeData(earthquakes.QuakeData):
+    def __init__(self, directory):
+        """
+        QuakeData backed by column files on disk
+        The catalogue is split in chunks, filters, statistics and aggregations are evaluated one chunk at a time
+        Only the columns of one chunk are memory mapped at any time, so memory is bounded by the chunk size
+        Chunks whose zone maps (min/max of lat, long, magnitude, time, significance and depth) rule out the current
+        filters are skipped without being read
+        count, magnitude_stats and magnitude_counts only hold one chunk. The functions returning a QuakeData np array
+        (quake_array, query, get_filtered_array, get_filtered_list) load every matching earthquake, the whole
+        catalogue without filters, and so do QuakeServer and compare_with_geojson. export_quake_data, deduplicate
+        and detect_rate_anomalies load the matching columns, without the Quake objects
+        :param directory: directory created by ChunkedQuakeData.create
+        """
+        self.directory = Path(directory)
+        metadata_path = self.directory / METADATA_FILE
+        if not metadata_path.exists():
+            raise ValueError(f"{directory} is not a chunked earthquake catalogue")
+
+        metadata = json.loads(metadata_path.read_text())
+        self.chunk_size = metadata['chunk_size']
+        self.chunks = metadata['chunks']
+
+        # set default filters
+        self.clear_filter()
+
+        # results of cached_query, at most cache_size of them and cache_bytes in total
+        self.cache_size = 128
+        self.cache_bytes = earthquakes.DEFAULT_CACHE_BYTES
+        self._cache_lock = threading.Lock()
+        self.reset_cache()
+
+    @classmethod
+    def create(cls, directory, dictionaries, chunk_size=100_000):
+        """
+        This function will create a chunked catalogue from geojson dictionaries
+        Dictionaries are processed one by one so the whole catalogue never has to fit in memory
+        :param directory: directory where the column files will be written
+        :param dictionaries: iterable of dictionaries of earthquakes in geojson format
+        :param chunk_size: maximum number of earthquakes in a chunk
+        :return: ChunkedQuakeData object
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        chunks = []
+        pending = []
+        pending_rows = 0
+
+        for dictionary in dictionaries:
+            columns = earthquakes.quake_array_to_columns(earthquakes.QuakeData(dictionary).quake_array)
+            pending.append(columns)
+            pending_rows += len(columns['magnitude'])
+
+            # write full chunks as soon as there are enough rows
+            while pending_rows >= chunk_size:
+                merged = {column: np.concatenate([part[column] for part in pending])
+                          for column in earthquakes.QUAKE_COLUMNS}
+                chunks.append(write_chunk(directory, len(chunks),
+                                          {column: values[:chunk_size] for column, values in merged.items()}))
+                pending = [{column: values[chunk_size:] for column, values in merged.items()}]
+                pending_rows -= chunk_size
+
+        # write whatever is left as the last chunk
+        if pending_rows > 0:
+            merged = {column: np.concatenate([part[column] for part in pending])
+                      for column in earthquakes.QUAKE_COLUMNS}
+            chunks.append(write_chunk(directory, len(chunks), merged))
+
+        (directory / METADATA_FILE).write_text(json.dumps({'chunk_size': chunk_size, 'chunks': chunks}))
+        return cls(directory)
+
+    @classmethod
+    def from_array(cls, quake_array):
+        """
+        The earthquakes of an np array are already in memory, so the result is a QuakeData object
+        :param quake_array: np array with the QUAKE_DTYPE
+        :return: QuakeData object without filters
+        """
+        return earthquakes.QuakeData.from_array(quake_array)
+
+    @property
+    def quake_array(self):
+        """
+        All the earthquakes loaded in memory, for code that expects a QuakeData np array
+        This loads the whole catalogue, on large catalogues prefer query with a filter or the chunk by chunk functions
+        :return: np array of all the earthquakes
+        """
+        return self.query()
+
+    def __len__(self):
+        return sum(chunk['rows'] for chunk in self.chunks)
+
+    def load_chunk(self, chunk):
+        """
+        This function will memory map the columns of a chunk
+        :param chunk: chunk metadata
+        :return: dictionary of column name -> read only np array
+        """
+        chunk_path = self.directory / chunk['name']
+        return {column: np.load(chunk_path / f"{column}.npy", mmap_mode='r') for column in earthquakes.QUAKE_COLUMNS}
+
+    def iter_filtered_columns(self, quake_filter=None):
+        """
+        This generator will yield the filtered columns of each chunk that can contain matches
+        Chunks whose zone maps rule out the filter are not read
+        :param quake_filter: QuakeFilter object, None for all the earthquakes
+        :return: iterator of dictionaries of column name -> np array
+        """
+        for chunk in self.chunks:
+            if quake_filter is None:
+                yield {column: np.asarray(values) for column, values in self.load_chunk(chunk).items()}
+                continue
+
+            if not quake_filter.may_match(chunk['zone_map']):
+                continue
+
+            columns = self.load_chunk(chunk)
+            mask = quake_filter.mask(columns)
+            if mask.any():
+                yield {column: np.asarray(values[mask]) for column, values in columns.items()}
+
+    def query(self, quake_filter=None):
+        """
+        This will filter the earthquakes chunk by chunk and build a QuakeData np array with the matches
+        Only the filtered rows are kept in memory
+        :param quake_filter: QuakeFilter object, None for all the earthquakes
+        :return: np array of filtered earthquakes
+        """
+        arrays = [earthquakes.columns_to_quake_array(columns) for columns in self.iter_filtered_columns(quake_filter)]
+
+        if not arrays:
+            return np.empty(0, dtype=earthquakes.QUAKE_DTYPE)
+        return np.concatenate(arrays)
+
+    def query_columns(self, quake_filter=None):
+        """
+        This will filter the earthquakes chunk by chunk and keep the matches as columns, without Quake objects
+        :param quake_filter: QuakeFilter object, None for all the earthquakes
+        :return: dictionary of column name -> np array with the QUAKE_COLUMNS dtypes
+        """
+        parts = list(self.iter_filtered_columns(quake_filter))
+        return {column: np.concatenate([part[column] for part in parts]) if parts else np.empty(0, dtype=dtype)
+                for column, dtype in earthquakes.QUAKE_COLUMNS.items()}
+
+    def count(self):
+        """
+        :return: number of earthquakes that pass the filters
+        """
+        return sum(len(columns['magnitude']) for columns in self.iter_filtered_columns(self.current_filter()))
+
+    def magnitude_stats(self, k=200):
+        """
+        This function will calculate the magnitude statistics of the filtered earthquakes chunk by chunk
+        The mean and standard deviation are exact, the median is estimated with a QuantileSketch
+        :param k: accuracy parameter of the QuantileSketch
+        :return: dictionary with count, mean, std, median and mode
+        """
+        moments = quake_stats.MomentsAccumulator()
+        sketch = quake_stats.QuantileSketch(k)
+        modes = quake_stats.ModeCounter()
+
+        for columns in self.iter_filtered_columns(self.current_filter()):
+            moments.update(columns['magnitude'])
+            sketch.update(columns['magnitude'])
+            modes.update(columns['magnitude'])
+
+        return {
+            'count': moments.count,
+            'mean': moments.mean if moments.count else math.nan,
+            'std': moments.std(),
+            'median': sketch.median(),
+            'mode': modes.mode()
+        }
+
+    def magnitude_counts(self):
+        """
+        This function will count the filtered earthquakes for each rounded magnitude
+        :return: dictionary of rounded magnitude -> number of earthquakes
+        """
+        modes = quake_stats.ModeCounter()
+        for columns in self.iter_filtered_columns(self.current_filter()):
+            modes.update(columns['magnitude'])
+        return dict(sorted(modes.counts.items()))
@@ -3,6 +3,10 @@ from pathlib import Path
 import json
 import numpy as np
 import earthquakes
+import feed_ingest
+import quake_anomaly
+import quake_association
+import quake_stats
 import matplotlib.pyplot as plt
 
 
@@ -40,14 +44,18 @@ def load_quake_data_from_dictionary(dictionary):
     """
     This function will receive a dictionary contained earthquakes in the geojson format
     Will create a QuakeData object with said dictionary
-    If there are no valid earthquakes in the QuakeData object will provide a message and exit
+    If the dictionary isnt in the geojson format or there are no valid earthquakes will provide a message and exit
     If there are at list one valid earthquake it will return the QuakeData
     :param dictionary: Dictionary of earthquakes in geojson format
     :return: QuakeData object
     """
 
     # create a new instance of the QuakeData class
-    quake_data = earthquakes.QuakeData(dictionary)
+    try:
+        quake_data = earthquakes.QuakeData(dictionary)
+    except ValueError as e:
+        print(e)
+        sys.exit()
 
     # Check that at least one valid earthquake was found
     number_of_valid_earthquakes = len(quake_data.get_filtered_list())
@@ -59,6 +67,34 @@ def load_quake_data_from_dictionary(dictionary):
     return quake_data
 
 
+def load_quake_data_from_feeds(urls):
+    """
+    This function will download the geojson feeds concurrently and merge them in a QuakeData object
+    Events that are in several feeds are kept once
+    Feeds that could not be loaded are reported and skipped
+    If there are no valid earthquakes in the QuakeData object will provide a message and exit
+    :param urls: list of feed urls
+    :return: QuakeData object
+    """
+    ingestor = feed_ingest.FeedIngestor()
+    quake_data = ingestor.ingest(urls)
+
+    # feeds overlap (for example the day and week feeds), keep each event once
+    quake_data = quake_association.deduplicate(quake_data, time_tolerance=1_000, distance_tolerance=1)
+
+    for url, error in ingestor.errors.items():
+        print(f"Could not load feed {url}: {error}")
+
+    # Check that at least one valid earthquake was found
+    number_of_valid_earthquakes = len(quake_data.get_filtered_list())
+    if number_of_valid_earthquakes == 0:
+        print("No earthquakes found in the provided feeds")
+        sys.exit()
+    else:
+        print(f"Feeds contained {number_of_valid_earthquakes} valid earthquakes")
+    return quake_data
+
+
 def set_location_filter(quake_data):
     """
     This method will set a filter of how far the earthquakes can be from a specific location
@@ -202,6 +238,21 @@ def display_exceptional_quakes(quake_data):
         print(quake)
 
 
+def display_rate_anomalies(quake_data):
+    """
+    This method will display the lat/long cells and days with an unusually high number of filtered earthquakes
+    :param quake_data: QuakeData object
+    """
+    anomalies = quake_anomaly.detect_rate_anomalies(quake_data, cell_size=0.1, bin_seconds=86_400)
+
+    if len(anomalies) == 0:
+        print("No rate anomalies in the earthquakes that pass current filters")
+    for anomaly in anomalies:
+        day = np.datetime64(int(anomaly['time']), 'ms').astype('datetime64[D]')
+        print(f"{day} cell ({anomaly['lat']:.1f}, {anomaly['long']:.1f}): {anomaly['count']} earthquakes, "
+              f"expected {anomaly['expected']:.2f} (p={anomaly['p_value']:.1e})")
+
+
 def display_magnitude_stats(quake_data):
     """
     This method will display the mean, standard deviation, mode, and median of the magnitude of the filtered earthquakes
@@ -214,20 +265,17 @@ def display_magnitude_stats(quake_data):
     # calculate stats
     mean = np.mean(filtered_array['magnitude'])
     std = np.std(filtered_array['magnitude'])
-    median = np.median(filtered_array['magnitude'])
+    median = quake_stats.median(filtered_array['magnitude'])
 
-    # round down the magnitude
-    round_mag = filtered_array['magnitude'].round().astype(int)
-
-    # calculate the mode
-    mode = np.argmax(np.bincount(round_mag))
+    # calculate the mode of the rounded magnitudes (negative magnitudes are valid)
+    mode = quake_stats.magnitude_mode(filtered_array['magnitude'])
 
     # display stats
     print("Magnitude Statistics")
     print(f"Mean: {mean:.2f}")
     print(f"Std Dev: {std:.2f}")
     print(f"Median: {median:.2f}")
-    print(f"Mode: {mode}")
+    print(f"Mode: {mode:.0f}")
 
 
 def display_quake_map(quake_data):
@@ -280,14 +328,19 @@ def display_magnitude_chart(quake_data):
 
 
 def main(argv):
-    # Check if a path was provided as a command line argument
-    if len(argv) > 0:
-        print(f"\nReceived file path to analyze: {argv[0]}")
-        geojson_dictionary = read_dictionary(argv[0])
+    # Check if feed urls were provided as command line arguments
+    if len(argv) > 0 and feed_ingest.is_url(argv[0]):
+        print(f"\nReceived {len(argv)} feed urls to analyze")
+        quake_data = load_quake_data_from_feeds(argv)
     else:
-        geojson_dictionary = read_dictionary()
+        # Check if a path was provided as a command line argument
+        if len(argv) > 0:
+            print(f"\nReceived file path to analyze: {argv[0]}")
+            geojson_dictionary = read_dictionary(argv[0])
+        else:
+            geojson_dictionary = read_dictionary()
 
-    quake_data = load_quake_data_from_dictionary(geojson_dictionary)
+        quake_data = load_quake_data_from_dictionary(geojson_dictionary)
 
     while True:
         option = input("""
@@ -299,8 +352,9 @@ def main(argv):
            6. Display Magnitude Stats
            7. Plot Quake Map
            8. Plot Magnitude Chart
-           9. Quit
-        Please select an option (1-9)
+           9. Display Rate Anomalies
+           10. Quit
+        Please select an option (1-10)
            """)
 
         option.strip()
@@ -321,6 +375,8 @@ def main(argv):
         elif option == "8":
             display_magnitude_chart(quake_data)
         elif option == "9":
+            display_rate_anomalies(quake_data)
+        elif option == "10":
             sys.exit()
         else:
             print("Invalid option, please select one of the options by choosing the number accordingly")
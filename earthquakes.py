@@ -1,10 +1,20 @@
 import math
 import json
-import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from pathlib import Path
 
+import quake_filters
+
+# mean earth radius used by the haversine formula
+EARTH_RADIUS_KM = 6371.0
+
+# default memory budget of the results kept by cached_query
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
 
 def ensure_numeric(value):
     """
@@ -20,6 +30,49 @@ def ensure_numeric(value):
         raise ValueError(f"{value} is not a numeric value")
 
 
+def coerce_numeric_array(values, dtype=np.float64):
+    """
+    This method will convert many values to numbers at once, the bulk version of ensure_numeric
+    The conversion is done with a single numpy call, values are only checked one by one if that call fails
+    :param values: a sequence or np array of values
+    :param dtype: dtype of the returned array, integer dtypes truncate like int() and reject nan/inf
+    :return: tuple of (np array of numbers with 0 in the rejected rows,
+                       np array of booleans, True for the valid rows,
+                       dictionary of rejected row -> reason)
+    """
+    dtype = np.dtype(dtype)
+
+    if isinstance(values, np.ndarray) and values.dtype.kind in "biuf":
+        converted = values.astype(np.float64).ravel()
+        reasons = {}
+    else:
+        # object array of the values, without np trying to guess a dtype
+        objects = np.empty(len(values), dtype=object)
+        objects[:] = list(values)
+        reasons = {}
+        try:
+            converted = objects.astype(np.float64)
+        except (TypeError, ValueError):
+            # at least one value is not numeric, find which ones
+            converted = np.full(len(objects), np.nan)
+            for i, value in enumerate(objects.tolist()):
+                try:
+                    converted[i] = float(value)
+                except (TypeError, ValueError):
+                    reasons[i] = f"{value} is not a numeric value"
+
+    valid = np.ones(len(converted), dtype=bool)
+    valid[list(reasons)] = False
+
+    # integers cannot hold nan or inf
+    if dtype.kind in "iu":
+        for i in np.flatnonzero(valid & ~np.isfinite(converted)).tolist():
+            reasons[i] = f"{converted[i]} is not a finite number"
+            valid[i] = False
+
+    return np.where(valid, converted, 0).astype(dtype), valid, reasons
+
+
 def calc_distance(lat1, lon1, lat2, lon2):
     """
     This function will calculate the distance between two coordinates
@@ -59,7 +112,55 @@ def calc_distance(lat1, lon1, lat2, lon2):
     return distance_kms
 
 
-def filter_invalid_earthquakes(earthquakes, magnitude_list, felt_list, significance_list, lat_list, long_list):
+def calc_distance_array(lat1, lon1, lat2, lon2):
+    """
+    This function will calculate the haversine distance between coordinates using np arrays
+    It gives the same result as calc_distance but for many coordinates at once (broadcasting applies)
+    :param lat1: Latitude(s) of the first point(s).
+    :param lon1: Longitude(s) of the first point(s).
+    :param lat2: Latitude(s) of the second point(s).
+    :param lon2: Longitude(s) of the second point(s).
+    :return: np array of distances in kilometers.
+    """
+    lat1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    lon1 = np.radians(np.asarray(lon1, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lon2, dtype=np.float64))
+
+    # apply haversine formula
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def calc_hypocentral_distance_array(lat1, lon1, depth1, lat2, lon2, depth2):
+    """
+    This function will calculate the straight line (3D) distance between points below the earth surface
+    Both points are converted to cartesian coordinates on a sphere of radius EARTH_RADIUS_KM - depth
+    :param lat1: Latitude(s) of the first point(s).
+    :param lon1: Longitude(s) of the first point(s).
+    :param depth1: Depth(s) of the first point(s) in kilometers, negative values for elevations.
+    :param lat2: Latitude(s) of the second point(s).
+    :param lon2: Longitude(s) of the second point(s).
+    :param depth2: Depth(s) of the second point(s) in kilometers.
+    :return: np array of distances in kilometers.
+    """
+    lat1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    lon_variation = np.radians(np.asarray(lon2, dtype=np.float64) - np.asarray(lon1, dtype=np.float64))
+    radius1 = EARTH_RADIUS_KM - np.asarray(depth1, dtype=np.float64)
+    radius2 = EARTH_RADIUS_KM - np.asarray(depth2, dtype=np.float64)
+
+    # law of cosines with the central angle, written with the haversine to stay accurate for close points
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(lon_variation / 2) ** 2
+    squared = (radius1 - radius2) ** 2 + 4 * radius1 * radius2 * a
+
+    return np.sqrt(np.maximum(squared, 0))
+
+
+def filter_invalid_earthquakes(earthquakes, magnitude_list, felt_list, significance_list, lat_list, long_list,
+                               depth_list=None):
     """
     This function receives a dictionary of earthquakes
     and discards the invalid ones. Valid earthquakes are those
@@ -70,13 +171,15 @@ def filter_invalid_earthquakes(earthquakes, magnitude_list, felt_list, significa
     3. The coordinates are in a tuple format (validated by the coordinate_is_tuple function).
     4. The 'properties' dictionary contains the keys: 'mag', 'time', 'felt', 'sig', 'type', and 'magType'.
 
-    Valid earthquakes will be added in a list of Quake objects
+    Valid earthquakes will be added in a list of Quake objects, keeping their id and network (properties 'net')
+    A dictionary that doesnt have the geojson structure raises a ValueError
     :param earthquakes: dictionary of earthquakes
     :param magnitude_list: an empty list to populate with magnitudes
     :param felt_list: an empty list to populate with felts
     :param significance_list: an empty list to populate with significances
     :param lat_list: an empty list to populate with latitudes
     :param long_list: an empty list to populate with longitudes
+    :param depth_list: optional empty list to populate with depths (kms)
     :return: a list of valid earthquakes
     """
 
@@ -106,32 +209,41 @@ def filter_invalid_earthquakes(earthquakes, magnitude_list, felt_list, significa
                             valid_earthquakes.append(earthquake)
 
     except Exception as e:
-        print("dictionary didnt match geojson format. for more information please visit "
-              "https://earthquake.usgs.gov/earthquakes/feed/v1.0/geojson.php ")
-        sys.exit()
-        #return e
+        raise ValueError("dictionary didnt match geojson format. for more information please visit "
+                         "https://earthquake.usgs.gov/earthquakes/feed/v1.0/geojson.php ") from e
 
     # empty list to populate with valid earthquakes
     quakes_list = []
 
-    # populate earthquake and field lists
-    for earthquake in valid_earthquakes:
-        try:
-            felt_list.append(int(earthquake['properties']['felt']))
+    properties = [earthquake['properties'] for earthquake in valid_earthquakes]
+    coordinates = [earthquake['geometry']['coordinates'] for earthquake in valid_earthquakes]
+
+    # convert each field in bulk, an earthquake is kept only if all its fields are valid
+    magnitudes, valid, _ = coerce_numeric_array([quake['mag'] for quake in properties])
+    times, valid_times, _ = coerce_numeric_array([quake['time'] for quake in properties], np.int64)
+    felts, valid_felts, _ = coerce_numeric_array([quake['felt'] for quake in properties], np.int64)
+    significances, valid_significances, _ = coerce_numeric_array([quake['sig'] for quake in properties], np.int64)
 
-            quakes_list.append(
-                Quake(float(earthquake['properties']['mag']), int(earthquake['properties']['time']),
-                      int(earthquake['properties']['felt']), int(earthquake['properties']['sig']),
-                      earthquake['properties']['type'], earthquake['geometry']['coordinates']))
+    # coordinates were already checked by coordinate_is_tuple
+    coordinate_array = np.array(coordinates, dtype=np.float64).reshape(-1, 3)
 
-            magnitude_list.append(float(earthquake['properties']['mag']))
-            significance_list.append(int(earthquake['properties']['sig']))
-            lat_list.append(float(earthquake['geometry']['coordinates'][0]))
-            long_list.append(float(earthquake['geometry']['coordinates'][1]))
+    kept = np.flatnonzero(valid & valid_times & valid_felts & valid_significances)
+
+    # populate earthquake and field lists
+    for i, magnitude, time, felt, significance in zip(kept.tolist(), magnitudes[kept].tolist(),
+                                                      times[kept].tolist(), felts[kept].tolist(),
+                                                      significances[kept].tolist()):
+        quakes_list.append(Quake(magnitude, time, felt, significance, properties[i]['type'], coordinates[i],
+                                 str(valid_earthquakes[i].get('id') or ""), str(properties[i].get('net') or "")))
+
+    magnitude_list.extend(magnitudes[kept].tolist())
+    felt_list.extend(felts[kept].tolist())
+    significance_list.extend(significances[kept].tolist())
+    lat_list.extend(coordinate_array[kept, 0].tolist())
+    long_list.extend(coordinate_array[kept, 1].tolist())
+    if depth_list is not None:
+        depth_list.extend(coordinate_array[kept, 2].tolist())
 
-        # if operation fails, continue to next entry
-        except ValueError as e:
-            continue
     # return earthquake list
     return quakes_list
 
@@ -154,6 +266,101 @@ def coordinate_is_tuple(earthquake):
         return False
 
 
+# dtype of the np array used by QuakeData
+QUAKE_DTYPE = np.dtype([
+    ('quake', object),
+    ('magnitude', np.float64),
+    ('felt', np.int32),
+    ('significance', np.int32),
+    ('lat', np.float64),
+    ('long', np.float64),
+    ('time', np.int64),
+    ('depth', np.float64)
+])
+
+
+def create_quake_array(quakes, magnitude_list, felt_list, significance_list, lat_list, long_list, depth_list):
+    """
+    This function will create the np array used by QuakeData
+    The fields are assigned column by column instead of row by row
+    :param quakes: list of Quake objects
+    :param magnitude_list: list of magnitudes
+    :param felt_list: list of felts
+    :param significance_list: list of significances
+    :param lat_list: list of latitudes
+    :param long_list: list of longitudes
+    :param depth_list: list of depths (kms)
+    :return: np array with the QUAKE_DTYPE
+    """
+
+    # create an empty array of the correct size
+    quake_array = np.empty(len(quakes), dtype=QUAKE_DTYPE)
+
+    # np would try to unpack the objects if the list was assigned directly
+    quake_column = np.empty(len(quakes), dtype=object)
+    quake_column[:] = quakes
+
+    # populate the array
+    quake_array['quake'] = quake_column
+    quake_array['magnitude'] = magnitude_list
+    quake_array['felt'] = felt_list
+    quake_array['significance'] = significance_list
+    quake_array['lat'] = lat_list
+    quake_array['long'] = long_list
+    quake_array['time'] = [quake.time for quake in quakes]
+    quake_array['depth'] = depth_list
+
+    return quake_array
+
+
+# columns needed to rebuild the earthquakes without the Quake objects, used when storing them
+QUAKE_COLUMNS = {
+    'magnitude': np.float64,
+    'felt': np.int32,
+    'significance': np.int32,
+    'lat': np.float64,
+    'long': np.float64,
+    'time': np.int64,
+    'depth': np.float64,
+    'q_type': np.str_,
+    'id': np.str_,
+    'source': np.str_
+}
+
+
+def quake_array_to_columns(quake_array):
+    """
+    This function will convert a QuakeData np array to a dictionary of QUAKE_COLUMNS
+    :param quake_array: np array with the QUAKE_DTYPE
+    :return: dictionary of column name -> np array
+    """
+    columns = {}
+    for column, dtype in QUAKE_COLUMNS.items():
+        # string columns are attributes of the Quake objects
+        if dtype is np.str_:
+            columns[column] = np.array([getattr(quake, column) for quake in quake_array['quake']], dtype=np.str_)
+        else:
+            columns[column] = quake_array[column]
+    return columns
+
+
+def columns_to_quake_array(columns):
+    """
+    This function will rebuild a QuakeData np array (with the Quake objects) from a dictionary of QUAKE_COLUMNS
+    :param columns: dictionary of column name -> np array
+    :return: np array with the QUAKE_DTYPE
+    """
+    quakes = [Quake(magnitude, time, felt, significance, q_type, (lat, long, depth), quake_id, source)
+              for magnitude, time, felt, significance, q_type, lat, long, depth, quake_id, source in
+              zip(columns['magnitude'].tolist(), columns['time'].tolist(), columns['felt'].tolist(),
+                  columns['significance'].tolist(), columns['q_type'].tolist(),
+                  columns['lat'].tolist(), columns['long'].tolist(), columns['depth'].tolist(),
+                  columns['id'].tolist(), columns['source'].tolist())]
+
+    return create_quake_array(quakes, columns['magnitude'], columns['felt'], columns['significance'],
+                              columns['lat'], columns['long'], columns['depth'])
+
+
 class QuakeData:
     def __init__(self, earthquakes):
 
@@ -163,73 +370,132 @@ class QuakeData:
         significance_list = []
         lat_list = []
         long_list = []
+        depth_list = []
 
         # set default filters
         self.location_filter = None
         self.property_filter = None
+        self.region_filter = None
+        self.depth_filter = None
+        self.hypocentral_filter = None
+
+        # results of cached_query, at most cache_size of them and cache_bytes in total
+        self.cache_size = 128
+        self.cache_bytes = DEFAULT_CACHE_BYTES
+        self._cache_lock = threading.Lock()
+        self.reset_cache()
 
         # create a list of Quake objects and update the list passed in the arguments
         quakes = filter_invalid_earthquakes(earthquakes, magnitude_list, felt_list,
-                                            significance_list, lat_list, long_list)
-
-        # create the dtype for the np array
-        dtype_arr = np.dtype([
-            ('quake', object),
-            ('magnitude', np.float64),
-            ('felt', np.int32),
-            ('significance', np.int32),
-            ('lat', np.float64),
-            ('long', np.float64)
-        ])
-
-        # create an empty array of the correct size
-        self.quake_array = np.empty(len(quakes), dtype=dtype_arr)
-
-        # populate the array
-        for i in range(len(quakes)):
-            self.quake_array[i] = (
-                quakes[i],
-                magnitude_list[i],
-                felt_list[i],
-                significance_list[i],
-                lat_list[i],
-                long_list[i]
-            )
+                                            significance_list, lat_list, long_list, depth_list)
+
+        # create the np array with one row per valid earthquake
+        self.quake_array = create_quake_array(quakes, magnitude_list, felt_list, significance_list,
+                                              lat_list, long_list, depth_list)
+
+    @classmethod
+    def from_array(cls, quake_array):
+        """
+        This function will create a QuakeData object from an existing np array of earthquakes
+        :param quake_array: np array with the QUAKE_DTYPE
+        :return: QuakeData object without filters
+        """
+        quake_data = cls({'features': []})
+        quake_data.quake_array = quake_array
+        quake_data.reset_cache()
+        return quake_data
 
     def get_filtered_array(self):
         """
         This will filter the earthquakes based on the location and property filters
         :return: np array of filtered earthquakes
         """
+        return self.query(self.current_filter())
 
-        # get all earthquakes
-        filtered_array = self.quake_array
-
-        # if there is a location filter apply
+    def current_filter(self):
+        """
+        This function will convert the filters set in the object to a filter object
+        They are combined in a single AndFilter, so each one only looks at the rows that passed the cheaper ones
+        :return: QuakeFilter object, None if there are no filters
+        """
+        filters = []
         if self.location_filter is not None:
-
-            # vectorize function so its usable by numpy
-            distance_vectorize = np.vectorize(calc_distance)
-
-            # np array with True if the location to the filter point is less or equal than the requested distance
-            location_filter = np.where(
-                distance_vectorize(filtered_array['lat'], filtered_array['long'], self.location_filter[0],
-                                   self.location_filter[1]) <= self.location_filter[2])
-            # update the array with the filter
-            filtered_array = filtered_array[location_filter]
-
-        # if there is a property filter apply
+            filters.append(quake_filters.LocationFilter(*self.location_filter))
         if self.property_filter is not None:
-            # np array with True if the felt, mag, and significance of the earthquakes are larger than the filter
-            property_filter = np.where((filtered_array['felt'] >= self.property_filter[1]) &
-                                       (filtered_array['magnitude'] >= self.property_filter[0]) &
-                                       (filtered_array['significance'] >= self.property_filter[2]), True, False)
+            filters.append(quake_filters.PropertyFilter(*self.property_filter))
+        if self.region_filter is not None:
+            filters.append(self.region_filter)
+        if self.depth_filter is not None:
+            filters.append(quake_filters.DepthFilter(*self.depth_filter))
+        if self.hypocentral_filter is not None:
+            filters.append(quake_filters.HypocentralFilter(*self.hypocentral_filter))
+
+        if not filters:
+            return None
+        if len(filters) == 1:
+            return filters[0]
+        return quake_filters.AndFilter(*filters)
+
+    def query(self, quake_filter=None):
+        """
+        This will filter the earthquakes with a filter object instead of the filters set in the object
+        It does not read or change the object, so it can be called from several threads at the same time
+        :param quake_filter: QuakeFilter object, None for all the earthquakes
+        :return: np array of filtered earthquakes
+        """
+        if quake_filter is None:
+            return self.quake_array
+        return self.quake_array[quake_filter.mask(self.quake_array)]
 
-            # apply filter
-            filtered_array = filtered_array[property_filter]
+    def cached_query(self, quake_filter=None):
+        """
+        This will filter the earthquakes like query, remembering the results of the most recent filters
+        The cache keeps at most cache_size results and cache_bytes bytes, the least recently used results are
+        forgotten first and a result larger than cache_bytes is not kept
+        The results are read only because they are shared between callers
+        :param quake_filter: QuakeFilter object, None for all the earthquakes
+        :return: read only np array of filtered earthquakes
+        """
+        with self._cache_lock:
+            if quake_filter in self._cache:
+                self._cache.move_to_end(quake_filter)
+                return self._cache[quake_filter][0]
+
+        # filter outside of the lock so other threads are not blocked
+        filtered = self.query(quake_filter)
+        result = filtered.view()
+        result.flags.writeable = False
+
+        # without a filter the result can be quake_array itself, it takes no extra memory
+        nbytes = 0 if filtered is vars(self).get('quake_array') else filtered.nbytes
+
+        with self._cache_lock:
+            if nbytes > self.cache_bytes:
+                return result
+            if quake_filter in self._cache:
+                self._cache_nbytes -= self._cache[quake_filter][1]
+            self._cache[quake_filter] = (result, nbytes)
+            self._cache_nbytes += nbytes
+            while len(self._cache) > self.cache_size or self._cache_nbytes > self.cache_bytes:
+                self._cache_nbytes -= self._cache.popitem(last=False)[1][1]
+        return result
+
+    def reset_cache(self):
+        """
+        This function will forget the results of cached_query, needed if quake_array is replaced
+        """
+        self._cache = OrderedDict()
+        self._cache_nbytes = 0
 
-        # return np array after the two optional filters
-        return filtered_array
+    def query_many(self, quake_filters, max_workers=None):
+        """
+        This will run several queries in a thread pool, numpy releases the GIL while filtering large arrays
+        :param quake_filters: list of QuakeFilter objects
+        :param max_workers: number of threads, the ThreadPoolExecutor default if not provided
+        :return: list of read only np arrays, in the same order as the filters
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.cached_query, quake_filters))
 
     def get_filtered_list(self):
         """
@@ -310,16 +576,64 @@ class QuakeData:
         else:
             self.property_filter = (magnitude, felt, significance)
 
+    def set_region_filter(self, region_filter):
+        """
+        This function will set a spatial region for the earthquakes
+        :param region_filter: BBoxFilter, PolygonFilter, MultiPolygonFilter or CorridorFilter object
+        """
+        if not isinstance(region_filter, (quake_filters.BBoxFilter, quake_filters.PolygonFilter,
+                                          quake_filters.MultiPolygonFilter, quake_filters.CorridorFilter)):
+            raise ValueError("Invalid/Missing parameters")
+        self.region_filter = region_filter
+
+    def set_depth_filter(self, min_depth=None, max_depth=None):
+        """
+        This function will set a range of depths for the earthquakes
+        :param min_depth: minimum depth (kms), None for no minimum
+        :param max_depth: maximum depth (kms), None for no maximum
+        """
+        # validate the values, will raise a ValueError if they are not valid
+        quake_filters.DepthFilter(min_depth, max_depth)
+        self.depth_filter = (min_depth, max_depth)
+
+    def set_hypocentral_filter(self, latitude, longitude, depth, distance):
+        """
+        This function will set a maximum 3D (hypocentral) distance to a site for the earthquakes
+        :param latitude: Latitude of the site
+        :param longitude: longitude of the site
+        :param depth: depth of the site (kms), negative values for elevations
+        :param distance: Maximum straight line distance to the site (kms)
+        """
+        # validate the values, will raise a ValueError if they are not valid
+        quake_filters.HypocentralFilter(latitude, longitude, depth, distance)
+        self.hypocentral_filter = (latitude, longitude, depth, distance)
+
     def clear_filter(self):
         """
-        This function will clear the location and property filters
+        This function will clear all the filters
         """
         self.location_filter = None
         self.property_filter = None
+        self.region_filter = None
+        self.depth_filter = None
+        self.hypocentral_filter = None
+
+
+def merge_quake_data(quake_data_list):
+    """
+    This function will merge the earthquakes of several QuakeData objects into a new one
+    Filters are not carried over
+    :param quake_data_list: list of QuakeData objects
+    :return: QuakeData object with all the earthquakes
+    """
+    arrays = [quake_data.quake_array for quake_data in quake_data_list]
+    if not arrays:
+        return QuakeData.from_array(np.empty(0, dtype=QUAKE_DTYPE))
+    return QuakeData.from_array(np.concatenate(arrays))
 
 
 class Quake:
-    def __init__(self, magnitude, time, felt, significance, q_type, coords):
+    def __init__(self, magnitude, time, felt, significance, q_type, coords, quake_id="", source=""):
         self.mag = magnitude
         self.time = time
         self.felt = felt
@@ -327,6 +641,10 @@ class Quake:
         self.q_type = q_type
         self.lat = float(coords[0])
         self.lon = float(coords[1])
+        self.depth = float(coords[2]) if len(coords) > 2 else 0.0
+        # event id and network that reported the earthquake, empty when unknown
+        self.id = quake_id
+        self.source = source
 
     def __str__(self):
         return (f"{self.mag} Magnitude Earthquake, {self.sig} Significance, felt by {self.felt} people in ({self.lat},"
@@ -337,3 +655,6 @@ class Quake:
 
     def get_distance_from(self, latitude, longitude):
         return calc_distance(self.lat, self.lon, latitude, longitude)
+
+    def get_hypocentral_distance_from(self, latitude, longitude, depth=0):
+        return float(calc_hypocentral_distance_array(self.lat, self.lon, self.depth, latitude, longitude, depth))
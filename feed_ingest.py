@@ -0,0 +1,289 @@
+import asyncio
+import gzip
+import json
+import ssl
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import earthquakes
+
+# USGS summary feeds https://earthquake.usgs.gov/earthquakes/feed/v1.0/geojson.php
+USGS_FEED_URL = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/{level}_{period}.geojson"
+USGS_FEED_PERIODS = ("hour", "day", "week", "month")
+USGS_FEED_LEVELS = ("significant", "4.5", "2.5", "1.0", "all")
+
+
+def usgs_feed_urls(periods=USGS_FEED_PERIODS, levels=USGS_FEED_LEVELS):
+    """
+    This function will build the urls of the USGS summary feeds
+    :param periods: periods of the feeds (hour, day, week, month)
+    :param levels: significance tiers of the feeds (significant, 4.5, 2.5, 1.0, all)
+    :return: list of urls
+    """
+    return [USGS_FEED_URL.format(level=level, period=period) for period in periods for level in levels]
+
+
+def is_url(path):
+    """
+    :param path: a path or url
+    :return: True if path is a http or https url
+    """
+    return str(path).startswith(("http://", "https://"))
+
+
+def parse_feed(body):
+    """
+    This function will parse the body of a geojson feed into a QuakeData object
+    :param body: bytes of the response
+    :return: QuakeData object
+    """
+    try:
+        dictionary = json.loads(body)
+    except ValueError:
+        raise ValueError("Feed is not valid json")
+
+    if not isinstance(dictionary, dict) or not isinstance(dictionary.get('features'), list):
+        raise ValueError("Feed didnt match geojson format")
+
+    return earthquakes.QuakeData(dictionary)
+
+
+class HTTPResponse:
+    def __init__(self, status, headers, body):
+        """
+        Response of a GET request
+        :param status: http status code
+        :param headers: dictionary of lower case header name -> value
+        :param body: bytes of the (decompressed) body
+        """
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class ConnectionPool:
+    def __init__(self, max_connections=8, timeout=30, ssl_context=None):
+        """
+        Pool of keep-alive HTTP/1.1 connections built on asyncio streams
+        Idle connections are kept per (scheme, host, port) and reused by later requests
+        :param max_connections: maximum number of requests in flight at the same time
+        :param timeout: seconds to wait for each network operation
+        :param ssl_context: ssl context for https urls, the default context if not provided
+        """
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.connections_opened = 0
+        self._idle = {}
+        self._semaphore = asyncio.Semaphore(max_connections)
+
+    async def _open(self, scheme, host, port):
+        ssl_context = None
+        if scheme == "https":
+            ssl_context = self.ssl_context or ssl.create_default_context()
+
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port, ssl=ssl_context),
+                                                self.timeout)
+        self.connections_opened += 1
+        return reader, writer
+
+    async def _read_body(self, reader, headers):
+        # chunked transfer encoding
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            parts = []
+            while True:
+                size_line = await reader.readline()
+                size = int(size_line.split(b";")[0].strip(), 16)
+                if size == 0:
+                    # skip trailers until the blank line
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return b"".join(parts), True
+                parts.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+
+        if 'content-length' in headers:
+            return await reader.readexactly(int(headers['content-length'])), True
+
+        # no length, the body ends when the server closes the connection
+        return await reader.read(), False
+
+    async def _request(self, reader, writer, host, path, headers):
+        request_headers = {
+            'Host': host,
+            'User-Agent': "geoquake-analyser",
+            'Accept-Encoding': "gzip",
+            'Connection': "keep-alive"
+        }
+        request_headers.update(headers)
+
+        request = f"GET {path} HTTP/1.1\r\n" + "".join(f"{name}: {value}\r\n"
+                                                      for name, value in request_headers.items()) + "\r\n"
+        writer.write(request.encode("latin-1"))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by the server")
+
+        version, status = status_line.decode("latin-1").split()[:2]
+        response_headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        status = int(status)
+        if status in (204, 304) or 100 <= status < 200:
+            body, reusable = b"", True
+        else:
+            body, reusable = await self._read_body(reader, response_headers)
+
+        if response_headers.get('content-encoding', '').lower() == 'gzip':
+            body = gzip.decompress(body)
+
+        if version == "HTTP/1.0" or response_headers.get('connection', '').lower() == 'close':
+            reusable = False
+
+        return HTTPResponse(status, response_headers, body), reusable
+
+    async def get(self, url, headers=None):
+        """
+        This function will send a GET request, reusing an idle connection to the same server if there is one
+        :param url: http or https url
+        :param headers: dictionary of extra request headers
+        :return: HTTPResponse
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        async with self._semaphore:
+            idle = self._idle.setdefault(key, [])
+
+            # a pooled connection may have been closed by the server while idle, retry once with a new one
+            for attempt in range(2):
+                reused = bool(idle)
+                reader, writer = idle.pop() if reused else await self._open(*key)
+                try:
+                    response, reusable = await asyncio.wait_for(
+                        self._request(reader, writer, parts.netloc, path, headers or {}), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+
+                if reusable:
+                    idle.append((reader, writer))
+                else:
+                    writer.close()
+                return response
+
+    async def close(self):
+        """
+        This function will close all the idle connections
+        """
+        for idle in self._idle.values():
+            for _, writer in idle:
+                writer.close()
+        self._idle = {}
+
+
+class FeedIngestor:
+    def __init__(self, max_connections=8, parse_workers=4, timeout=30, ssl_context=None):
+        """
+        This class will download geojson feeds concurrently and load them into a single QuakeData
+        Each feed is parsed in a worker thread as soon as its download finishes, while the others keep downloading
+        Responses are cached with their ETag / Last-Modified so later ingests send conditional GET requests
+        and reuse the parsed QuakeData when the server answers 304 Not Modified
+        :param max_connections: maximum number of downloads in flight
+        :param parse_workers: number of threads used to parse the feeds
+        :param timeout: seconds to wait for each network operation
+        :param ssl_context: ssl context for https feeds
+        """
+        self.max_connections = max_connections
+        self.parse_workers = parse_workers
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+
+        # url -> {'etag', 'last_modified', 'quake_data'}
+        self.cache = {}
+
+        # url -> error message of the last ingest
+        self.errors = {}
+
+        # url -> http status of the last ingest
+        self.statuses = {}
+
+    async def _fetch_and_parse(self, pool, executor, url):
+        headers = {}
+        cached = self.cache.get(url)
+        if cached is not None:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        response = await pool.get(url, headers)
+        self.statuses[url] = response.status
+
+        # feed did not change since the last ingest
+        if response.status == 304 and cached is not None:
+            return cached['quake_data']
+
+        if response.status != 200:
+            raise ValueError(f"HTTP status {response.status}")
+
+        # parse in a worker thread so the event loop keeps downloading
+        quake_data = await asyncio.get_running_loop().run_in_executor(executor, parse_feed, response.body)
+
+        self.cache[url] = {
+            'etag': response.headers.get('etag'),
+            'last_modified': response.headers.get('last-modified'),
+            'quake_data': quake_data
+        }
+        return quake_data
+
+    async def ingest_async(self, urls):
+        """
+        This function will download and parse all the feeds and merge them
+        Feeds that fail are skipped and their error is stored in self.errors
+        :param urls: list of feed urls
+        :return: QuakeData object with the earthquakes of all the feeds, in the order of the urls
+        """
+        self.errors = {}
+        self.statuses = {}
+        pool = ConnectionPool(self.max_connections, self.timeout, self.ssl_context)
+
+        with ThreadPoolExecutor(max_workers=self.parse_workers) as executor:
+            try:
+                results = await asyncio.gather(*[self._fetch_and_parse(pool, executor, url) for url in urls],
+                                               return_exceptions=True)
+            finally:
+                await pool.close()
+
+        quake_data_list = []
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                self.errors[url] = str(result) or type(result).__name__
+            else:
+                quake_data_list.append(result)
+
+        return earthquakes.merge_quake_data(quake_data_list)
+
+    def ingest(self, urls):
+        """
+        This function will run ingest_async in a new event loop
+        :param urls: list of feed urls
+        :return: QuakeData object with the earthquakes of all the feeds
+        """
+        return asyncio.run(self.ingest_async(urls))
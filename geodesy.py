@@ -0,0 +1,127 @@
+import numpy as np
+
+import earthquakes
+
+# default memory budget of a block of iter_distance_matrix
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def initial_bearing(lat1, lon1, lat2, lon2, dtype=np.float64):
+    """
+    This function will calculate the initial bearing of the great circle from the first points to the second ones
+    (broadcasting applies)
+    :param lat1: Latitude(s) of the first point(s).
+    :param lon1: Longitude(s) of the first point(s).
+    :param lat2: Latitude(s) of the second point(s).
+    :param lon2: Longitude(s) of the second point(s).
+    :param dtype: np.float64 or np.float32
+    :return: np array of bearings in degrees, clockwise from north in [0, 360)
+    """
+    lat1 = np.radians(np.asarray(lat1, dtype=dtype))
+    lat2 = np.radians(np.asarray(lat2, dtype=dtype))
+    lon_variation = np.radians(np.asarray(lon2, dtype=dtype) - np.asarray(lon1, dtype=dtype))
+
+    y = np.sin(lon_variation) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(lon_variation)
+
+    return np.degrees(np.arctan2(y, x)) % 360
+
+
+def destination_point(lat, lon, bearing, distance, dtype=np.float64):
+    """
+    This function will calculate the point reached travelling a distance along a great circle (broadcasting applies)
+    :param lat: Latitude(s) of the starting point(s).
+    :param lon: Longitude(s) of the starting point(s).
+    :param bearing: initial bearing(s) in degrees, clockwise from north
+    :param distance: distance(s) in kilometers
+    :param dtype: np.float64 or np.float32
+    :return: tuple of np arrays (latitudes, longitudes), longitudes in [-180, 180)
+    """
+    lat = np.radians(np.asarray(lat, dtype=dtype))
+    lon = np.radians(np.asarray(lon, dtype=dtype))
+    bearing = np.radians(np.asarray(bearing, dtype=dtype))
+    angle = np.asarray(distance, dtype=dtype) / np.asarray(earthquakes.EARTH_RADIUS_KM, dtype=dtype)
+
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    sin_angle = np.sin(angle)
+    cos_angle = np.cos(angle)
+
+    sin_destination = np.clip(sin_lat * cos_angle + cos_lat * sin_angle * np.cos(bearing), -1, 1)
+    destination_lat = np.arcsin(sin_destination)
+    destination_lon = lon + np.arctan2(np.sin(bearing) * sin_angle * cos_lat, cos_angle - sin_lat * sin_destination)
+
+    return np.degrees(destination_lat), (np.degrees(destination_lon) + 180) % 360 - 180
+
+
+def iter_distance_matrix(station_lats, station_longs, event_lats, event_longs, max_bytes=DEFAULT_MAX_BYTES,
+                         dtype=np.float64):
+    """
+    This function will generate the station x event haversine distance matrix in blocks of events
+    Each block and its temporary arrays use about max_bytes, so the full matrix never has to fit in memory
+    :param station_lats: np array of station latitudes
+    :param station_longs: np array of station longitudes
+    :param event_lats: np array of event latitudes
+    :param event_longs: np array of event longitudes
+    :param max_bytes: memory budget of a block
+    :param dtype: np.float64, or np.float32 for half the memory and about 4 times the speed. float32 errors are
+        under 20 meters, except for almost antipodal points (a few kms)
+    :return: generator of (first event, last event + 1, np array of distances in kms with one row per station)
+    """
+    dtype = np.dtype(dtype).type
+    station_lats = np.radians(np.asarray(station_lats, dtype=dtype))
+    station_longs = np.radians(np.asarray(station_longs, dtype=dtype))
+    event_lats = np.radians(np.asarray(event_lats, dtype=dtype))
+    event_longs = np.radians(np.asarray(event_longs, dtype=dtype))
+
+    # the cosines only depend on one of the points
+    station_cosines = np.cos(station_lats)[:, None]
+    event_cosines = np.cos(event_lats)
+
+    # a block needs the distances and one temporary array
+    columns = max(1, int(max_bytes // (2 * np.dtype(dtype).itemsize * max(len(station_lats), 1))))
+    half = dtype(0.5)
+
+    for start in range(0, len(event_lats), columns):
+        end = min(start + columns, len(event_lats))
+
+        # haversine formula, computed in place
+        block = np.subtract.outer(station_longs, event_longs[start:end])
+        block *= half
+        np.sin(block, out=block)
+        np.square(block, out=block)
+        block *= station_cosines
+        block *= event_cosines[start:end]
+
+        temporary = np.subtract.outer(station_lats, event_lats[start:end])
+        temporary *= half
+        np.sin(temporary, out=temporary)
+        np.square(temporary, out=temporary)
+        block += temporary
+        del temporary
+
+        np.clip(block, 0, 1, out=block)
+        np.sqrt(block, out=block)
+        np.arcsin(block, out=block)
+        block *= dtype(2 * earthquakes.EARTH_RADIUS_KM)
+
+        yield start, end, block
+
+
+def distance_matrix(station_lats, station_longs, event_lats, event_longs, max_bytes=DEFAULT_MAX_BYTES,
+                    dtype=np.float64):
+    """
+    This function will calculate the full station x event haversine distance matrix
+    :param station_lats: np array of station latitudes
+    :param station_longs: np array of station longitudes
+    :param event_lats: np array of event latitudes
+    :param event_longs: np array of event longitudes
+    :param max_bytes: memory budget of the temporary blocks
+    :param dtype: np.float64 or np.float32
+    :return: np array of distances in kms, one row per station and one column per event
+    """
+    matrix = np.empty((len(station_lats), len(event_lats)), dtype=dtype)
+    for start, end, block in iter_distance_matrix(station_lats, station_longs, event_lats, event_longs, max_bytes,
+                                                  dtype):
+        matrix[:, start:end] = block
+    return matrix
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockFeedHandler(BaseHTTPRequestHandler):
+    # keep-alive connections like the real feed servers
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server.mock
+        with server.lock:
+            server.request_count += 1
+
+        # simulate network latency
+        if server.delay:
+            time.sleep(server.delay)
+
+        feed = server.feeds.get(self.path)
+        if feed is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body, etag, last_modified = feed
+
+        # conditional GET, If-None-Match takes precedence over If-Modified-Since
+        if "If-None-Match" in self.headers:
+            not_modified = self.headers["If-None-Match"] == etag
+        else:
+            not_modified = self.headers.get("If-Modified-Since") == last_modified
+
+        if not_modified:
+            with server.lock:
+                server.not_modified_count += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # keep test output clean
+        pass
+
+
+class MockFeedServer:
+    def __init__(self, delay=0):
+        """
+        Local stand-in for the USGS feed server, used to test the feed ingestion offline
+        Feeds are served over HTTP/1.1 with ETag and Last-Modified headers and answer 304 to conditional requests
+        :param delay: seconds to wait before answering each request
+        """
+        self.delay = delay
+        self.feeds = {}
+        self.request_count = 0
+        self.not_modified_count = 0
+        self.lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def set_feed(self, path, dictionary):
+        """
+        This function will add or replace a feed
+        :param path: path of the feed, for example /summary/all_day.geojson
+        :param dictionary: dictionary of earthquakes in geojson format
+        """
+        body = json.dumps(dictionary).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.feeds[path] = (body, etag, formatdate(time.time(), usegmt=True))
+
+    def url(self, path):
+        """
+        :param path: path of a feed
+        :return: url of the feed in this server
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def start(self):
+        """
+        This function will start serving in a background thread on a free local port
+        """
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), MockFeedHandler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        This function will stop the server
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
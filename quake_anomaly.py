@@ -0,0 +1,256 @@
+import math
+
+import numpy as np
+
+import chunked_quakes
+
+# dtype of the anomalies found by RateAnomalyDetector
+ANOMALY_DTYPE = np.dtype([
+    ('time', np.int64),
+    ('lat', np.float64),
+    ('long', np.float64),
+    ('count', np.int64),
+    ('expected', np.float64),
+    ('p_value', np.float64)
+])
+
+# lgamma for np arrays, only used on the few candidate cells
+_log_gamma = np.vectorize(math.lgamma, otypes=[np.float64])
+
+
+def poisson_upper_tail(counts, rates):
+    """
+    This function will calculate P(X >= count) for Poisson variables, summing the tail from count upwards
+    The sum converges quickly because it is only used with counts above the rate
+    :param counts: np array of observed counts
+    :param rates: np array of expected counts (larger than 0)
+    :return: np array of probabilities
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    rates = np.asarray(rates, dtype=np.float64)
+
+    # probability of exactly count events, in log space to avoid overflows
+    term = np.exp(-rates + counts * np.log(rates) - _log_gamma(counts + 1))
+    total = term.copy()
+
+    for step in range(1, 1000):
+        term = term * rates / (counts + step)
+        total += term
+        if np.all(term <= total * 1e-15):
+            break
+
+    return np.minimum(total, 1.0)
+
+
+class RateAnomalyDetector:
+    def __init__(self, cell_size=0.1, bin_seconds=86_400, alpha=1e-6, min_events=3, min_rate=0.01,
+                 warmup_bins=7, half_life_bins=None):
+        """
+        This class will find sudden increases of the earthquake rate (swarms) in lat/long cells
+        Earthquakes are binned by cell and time bin. Each cell keeps its number of earthquakes so far, and its
+        baseline rate is that number divided by the number of bins observed. A cell is anomalous in a time bin when
+        observing that many earthquakes is very unlikely for a Poisson variable with the baseline rate
+        Only cells with earthquakes are stored (sorted np arrays of cell keys and totals), so global grids of
+        0.1 degrees over years of data do not need a dense lat x long x time array
+        :param cell_size: size of the cells in degrees
+        :param bin_seconds: length of the time bins in seconds
+        :param alpha: maximum Poisson probability of the count for a cell to be anomalous, small because every
+            cell of every bin is a test
+        :param min_events: minimum number of earthquakes in a cell and time bin to be anomalous
+        :param min_rate: minimum baseline rate (earthquakes per bin), used for cells without history
+        :param warmup_bins: number of bins observed before anomalies are reported (not affected by the decay)
+        :param half_life_bins: if provided, older bins weigh less in the baseline (exponential decay)
+        """
+        if cell_size <= 0 or bin_seconds <= 0 or min_rate <= 0:
+            raise ValueError("cell_size, bin_seconds and min_rate must be positive")
+
+        self.cell_size = cell_size
+        self.bin_ms = int(bin_seconds * 1000)
+        self.alpha = alpha
+        self.min_events = min_events
+        self.min_rate = min_rate
+        self.warmup_bins = warmup_bins
+        self.decay = 1.0 if half_life_bins is None else 0.5 ** (1 / half_life_bins)
+
+        # cell keys are built from the lat and long cell indices, shifted so they are never negative
+        self._offset = int(math.ceil(360 / cell_size)) + 1
+        self._stride = 2 * self._offset + 1
+
+        # sparse state: sorted cell keys, weighted number of earthquakes per cell and weighted number of bins
+        self.cells = np.empty(0, dtype=np.int64)
+        self.totals = np.empty(0, dtype=np.float64)
+        # the totals are stored divided by this scale, so the decay does not touch every cell
+        self.scale = 1.0
+        self.exposure = 0.0
+        # number of bins observed, not decayed, used for the warmup
+        self.observed_bins = 0
+        self.last_bin = None
+
+        # earthquakes of the time bin that is still open (keys arrays)
+        self.open_bin = None
+        self.pending = []
+
+    def cell_keys(self, lats, longs):
+        """
+        :param lats: np array of latitudes
+        :param longs: np array of longitudes
+        :return: np array of cell keys
+        """
+        lat_cells = np.floor(np.asarray(lats, dtype=np.float64) / self.cell_size).astype(np.int64)
+        long_cells = np.floor(np.asarray(longs, dtype=np.float64) / self.cell_size).astype(np.int64)
+        return (lat_cells + self._offset) * self._stride + (long_cells + self._offset)
+
+    def cell_corners(self, keys):
+        """
+        :param keys: np array of cell keys
+        :return: tuple of np arrays with the minimum latitude and longitude of each cell
+        """
+        lat_cells = keys // self._stride - self._offset
+        long_cells = keys % self._stride - self._offset
+        return lat_cells * self.cell_size, long_cells * self.cell_size
+
+    def baseline(self, keys):
+        """
+        :param keys: np array of cell keys
+        :return: np array with the baseline rate (earthquakes per bin) of each cell
+        """
+        rates = np.full(len(keys), self.min_rate)
+        if len(self.cells) == 0 or self.exposure == 0:
+            return rates
+
+        positions = np.minimum(np.searchsorted(self.cells, keys), len(self.cells) - 1)
+        known = self.cells[positions] == keys
+        rates[known] = np.maximum(self.totals[positions[known]] * self.scale / self.exposure, self.min_rate)
+        return rates
+
+    def _age(self, bins):
+        # age the baseline by a number of bins
+        self.observed_bins += bins
+        if self.decay == 1.0:
+            self.exposure += bins
+        else:
+            factor = self.decay ** bins
+            self.scale *= factor
+            self.exposure = self.exposure * factor + (1 - factor) / (1 - self.decay)
+
+            # avoid underflows of the scale
+            if self.scale < 1e-100:
+                self.totals *= self.scale
+                self.scale = 1.0
+
+    def _test(self, time_bin, cells, counts):
+        # find the anomalous cells of a bin, against the baseline of the previous bins
+        if self.observed_bins == 0 or self.observed_bins < self.warmup_bins:
+            return None
+
+        candidates = counts >= self.min_events
+        candidates[candidates] = counts[candidates] > self.baseline(cells[candidates])
+        if not candidates.any():
+            return None
+
+        cells = cells[candidates]
+        counts = counts[candidates]
+        rates = self.baseline(cells)
+        p_values = poisson_upper_tail(counts, rates)
+        anomalous = p_values < self.alpha
+        if not anomalous.any():
+            return None
+
+        lats, longs = self.cell_corners(cells[anomalous])
+        anomalies = np.empty(int(anomalous.sum()), dtype=ANOMALY_DTYPE)
+        anomalies['time'] = time_bin * self.bin_ms
+        anomalies['lat'] = lats
+        anomalies['long'] = longs
+        anomalies['count'] = counts[anomalous]
+        anomalies['expected'] = rates[anomalous]
+        anomalies['p_value'] = p_values[anomalous]
+        return anomalies
+
+    def _add(self, cells, totals):
+        # merge sorted unique cells into the sorted state without sorting it again
+        positions = np.searchsorted(self.cells, cells)
+        known = positions < len(self.cells)
+        known[known] = self.cells[positions[known]] == cells[known]
+        self.totals[positions[known]] += totals[known]
+
+        new = ~known
+        if new.any():
+            self.cells = np.insert(self.cells, positions[new], cells[new])
+            self.totals = np.insert(self.totals, positions[new], totals[new])
+
+    def _close(self):
+        # test the open bin, then add it to the baseline
+        if self.open_bin is None:
+            return None
+
+        # bins without earthquakes count too
+        if self.last_bin is not None:
+            self._age(self.open_bin - self.last_bin - 1)
+
+        cells, counts = np.unique(np.concatenate(self.pending), return_counts=True)
+        anomalies = self._test(self.open_bin, cells, counts)
+
+        self._age(1)
+        self._add(cells, counts / self.scale)
+
+        self.last_bin = self.open_bin
+        self.open_bin = None
+        self.pending = []
+        return anomalies
+
+    def update(self, quake_array):
+        """
+        This function will add earthquakes to the detector
+        A time bin is tested when an earthquake of a later bin arrives (or with flush), so earthquakes should arrive
+        in time order across calls. Earthquakes older than the open bin are counted in the open bin
+        :param quake_array: QuakeData np array or dictionary with 'lat', 'long' and 'time' columns
+        :return: np array (ANOMALY_DTYPE) of the anomalies found in the bins closed by these earthquakes
+        """
+        keys = self.cell_keys(quake_array['lat'], quake_array['long'])
+        time_bins = np.asarray(quake_array['time'], dtype=np.int64) // self.bin_ms
+        if self.open_bin is not None:
+            time_bins = np.maximum(time_bins, self.open_bin)
+
+        # group the earthquakes by time bin
+        order = np.argsort(time_bins, kind='stable')
+        keys = keys[order]
+        time_bins = time_bins[order]
+        bin_starts = np.flatnonzero(np.r_[True, time_bins[1:] != time_bins[:-1]]) if len(time_bins) else []
+
+        found = []
+        for start, end in zip(bin_starts, np.r_[bin_starts[1:], len(time_bins)]):
+            time_bin = int(time_bins[start])
+            if time_bin != self.open_bin:
+                found.append(self._close())
+                self.open_bin = time_bin
+            self.pending.append(keys[start:end])
+
+        found = [anomalies for anomalies in found if anomalies is not None]
+        return np.concatenate(found) if found else np.empty(0, dtype=ANOMALY_DTYPE)
+
+    def flush(self):
+        """
+        This function will test the open time bin, call it when no more earthquakes are expected in it
+        :return: np array (ANOMALY_DTYPE) of the anomalies found in the open bin
+        """
+        anomalies = self._close()
+        return anomalies if anomalies is not None else np.empty(0, dtype=ANOMALY_DTYPE)
+
+
+def detect_rate_anomalies(quake_data, cell_size=0.1, bin_seconds=86_400, **kwargs):
+    """
+    This function will find rate anomalies in the filtered earthquakes of a QuakeData object
+    :param quake_data: QuakeData object, its filters are applied
+    :param cell_size: size of the cells in degrees
+    :param bin_seconds: length of the time bins in seconds
+    :param kwargs: other parameters of RateAnomalyDetector
+    :return: np array (ANOMALY_DTYPE) of the anomalies, in time order
+    """
+    detector = RateAnomalyDetector(cell_size, bin_seconds, **kwargs)
+
+    # the chunks of a chunked catalogue are not in time order, its filtered columns are read without Quake objects
+    if isinstance(quake_data, chunked_quakes.ChunkedQuakeData):
+        anomalies = detector.update(quake_data.query_columns(quake_data.current_filter()))
+    else:
+        anomalies = detector.update(quake_data.get_filtered_array())
+    return np.concatenate((anomalies, detector.flush()))
@@ -0,0 +1,347 @@
+import math
+
+import numpy as np
+
+import chunked_quakes
+import earthquakes
+
+# km per degree of latitude
+KM_PER_DEGREE = math.pi * earthquakes.EARTH_RADIUS_KM / 180
+
+# maximum number of candidate pairs expanded at once, bounds the memory of find_duplicate_pairs
+PAIR_BATCH_SIZE = 4_000_000
+
+
+def neighbour_buckets(lats, longs, distance):
+    """
+    This function will find the buckets of the 3 x 3 cells around each earthquake
+    Buckets are lat bands divided in longitude columns, both at least distance kms wide. Bands closer to the poles
+    have fewer (wider) columns, and the columns wrap around at 180 degrees
+    :param lats: np array of latitudes
+    :param longs: np array of longitudes
+    :param distance: minimum size of the buckets (kms)
+    :return: np array with 9 buckets per earthquake, the middle one (index 4) is the bucket of the earthquake
+    """
+    band_size = max(distance / KM_PER_DEGREE, 1e-6)
+    bands = np.floor(lats / band_size).astype(np.int64)
+    first_band = int(bands.min()) - 1
+
+    # a guest is copied to the neighbouring bands, so the columns of a band must be wide enough for pairs with
+    # a point in the band above or below: use the latitude farthest from the equator over the 3 bands
+    band_starts = np.arange(first_band - 1, int(bands.max()) + 3) * band_size
+    max_lats = np.minimum(np.maximum(np.abs(band_starts), np.abs(band_starts + band_size)), 90)
+    max_lats = np.maximum(np.maximum(max_lats[:-2], max_lats[1:-1]), max_lats[2:])
+
+    # two points at most distance kms apart with latitudes up to max_lat have
+    # sin(long difference / 2) <= sin(angle / 2) / cos(max_lat)
+    half_angle = np.radians(min(band_size, 180)) / 2
+    cosines = np.cos(np.radians(max_lats))
+    ratios = np.sin(half_angle) / np.maximum(cosines, 1e-12)
+    widths = np.degrees(2 * np.arcsin(np.minimum(ratios, 1)))
+    columns = np.where(ratios < 1, np.floor(360 / widths), 1).astype(np.int64)
+    columns = np.maximum(columns, 1)
+    band_offsets = np.r_[0, np.cumsum(columns)[:-1]]
+
+    buckets = []
+    for band_step in (-1, 0, 1):
+        band_index = bands + band_step - first_band
+        band_columns = columns[band_index]
+        column = np.floor((longs + 180) / 360 * band_columns).astype(np.int64)
+        for column_step in (-1, 0, 1):
+            buckets.append(band_offsets[band_index] + (column + column_step) % band_columns)
+    return np.stack(buckets, axis=1)
+
+
+def find_duplicate_pairs(quake_array, time_tolerance=16_000, distance_tolerance=100, magnitude_tolerance=None):
+    """
+    This function will find the pairs of earthquakes that may be the same event
+    Earthquakes are paired when they have the same id, or when they are within the tolerances and do not come from
+    the same network (source) with different ids
+    Instead of comparing every pair, each earthquake is copied (as a guest) to the 9 buckets around it, and the
+    guests of each bucket are sorted by time. The candidates of an earthquake are the guests of its own bucket in
+    its time window, found with a binary search
+    :param quake_array: np array of earthquakes (QUAKE_DTYPE) or dictionary of columns ('lat', 'long', 'time'
+        and optionally 'magnitude', 'id' and 'source')
+    :param time_tolerance: maximum time difference (ms)
+    :param distance_tolerance: maximum epicentral distance (kms)
+    :param magnitude_tolerance: maximum magnitude difference, not checked if None
+    :return: tuple of np arrays (first, second) with the row indices of each pair, first < second
+    """
+    lats = np.asarray(quake_array['lat'], dtype=np.float64)
+    longs = np.asarray(quake_array['long'], dtype=np.float64)
+    times = np.asarray(quake_array['time'], dtype=np.int64)
+    rows = len(times)
+    if rows == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    # buckets and times are combined in a single sorted int64 key
+    start = times.min() - time_tolerance
+    span = int(times.max()) - int(start) + time_tolerance + 1
+    buckets = neighbour_buckets(lats, longs, distance_tolerance)
+
+    # with small buckets there can be too many of them, only the used ones are numbered then
+    if (int(buckets.max()) + 1) * span >= 2 ** 62:
+        used_buckets, buckets = np.unique(buckets, return_inverse=True)
+        buckets = buckets.reshape(rows, 9)
+        if len(used_buckets) * span >= 2 ** 62:
+            raise ValueError("The time span of the earthquakes is too long for the distance tolerance")
+
+    # guest copies, sorted by bucket then time
+    guest_rows = np.repeat(np.arange(rows), 9)
+    guest_keys = buckets.ravel() * span + (times[guest_rows] - start)
+    order = np.argsort(guest_keys)
+    guest_keys = guest_keys[order]
+    guest_rows = guest_rows[order]
+
+    # time window of each earthquake in its own bucket, the binary searches are much faster with sorted keys
+    home_keys = buckets[:, 4] * span + (times - start)
+    home_order = np.argsort(home_keys)
+    lows = np.empty(rows, dtype=np.int64)
+    highs = np.empty(rows, dtype=np.int64)
+    lows[home_order] = np.searchsorted(guest_keys, home_keys[home_order] - time_tolerance, side='left')
+    highs[home_order] = np.searchsorted(guest_keys, home_keys[home_order] + time_tolerance, side='right')
+    counts = highs - lows
+
+    if magnitude_tolerance is not None:
+        magnitudes = np.asarray(quake_array['magnitude'], dtype=np.float64)
+
+    firsts = []
+    seconds = []
+
+    # expand the candidates in batches of earthquakes
+    ends = np.cumsum(counts)
+    batch_start = 0
+    while batch_start < rows:
+        batch_end = int(np.searchsorted(ends, ends[batch_start] - counts[batch_start] + PAIR_BATCH_SIZE,
+                                        side='right'))
+        batch_end = min(max(batch_end, batch_start + 1), rows)
+        batch = np.arange(batch_start, batch_end)
+
+        batch_counts = counts[batch]
+        first = np.repeat(batch, batch_counts)
+        offsets = np.arange(len(first)) - np.repeat(np.cumsum(batch_counts) - batch_counts, batch_counts)
+        second = guest_rows[np.repeat(lows[batch], batch_counts) + offsets]
+
+        # each pair is found from both earthquakes, keep it once
+        keep = first < second
+        first = first[keep]
+        second = second[keep]
+
+        keep = earthquakes.calc_distance_array(lats[first], longs[first], lats[second], longs[second]) <= \
+            distance_tolerance
+        if magnitude_tolerance is not None:
+            keep &= np.abs(magnitudes[first] - magnitudes[second]) <= magnitude_tolerance
+        firsts.append(first[keep])
+        seconds.append(second[keep])
+
+        batch_start = batch_end
+
+    first = np.concatenate(firsts)
+    second = np.concatenate(seconds)
+    quake_ids = event_ids(quake_array)
+    if quake_ids is not None:
+        # a network does not report the same event twice, its earthquakes with different ids are different events
+        sources = event_sources(quake_array)
+        same_network = (sources[first] == sources[second]) & (sources[first] != "")
+        different_ids = (quake_ids[first] != quake_ids[second]) & (quake_ids[first] != "") & \
+            (quake_ids[second] != "")
+        keep = ~(same_network & different_ids)
+
+        # earthquakes with the same id are always the same event
+        id_first, id_second = same_id_pairs(quake_ids)
+        first = np.concatenate((first[keep], id_first))
+        second = np.concatenate((second[keep], id_second))
+
+    # bands near the poles have few columns, so a pair can be found from several buckets
+    pairs = np.unique(first * rows + second)
+    return pairs // rows, pairs % rows
+
+
+def event_ids(quake_array):
+    """
+    :param quake_array: np array of earthquakes (QUAKE_DTYPE) or dictionary of columns
+    :return: np array with the id of each earthquake, None if not available
+    """
+    if isinstance(quake_array, dict):
+        return np.asarray(quake_array['id']) if 'id' in quake_array else None
+    return np.array([quake.id for quake in quake_array['quake']], dtype=np.str_)
+
+
+def event_sources(quake_array):
+    """
+    :param quake_array: np array of earthquakes (QUAKE_DTYPE) or dictionary of columns
+    :return: np array with the source (network) of each earthquake, empty strings if not available
+    """
+    if isinstance(quake_array, dict):
+        if 'source' in quake_array:
+            return np.asarray(quake_array['source'])
+        return np.full(len(quake_array['time']), "", dtype=np.str_)
+    return np.array([quake.source for quake in quake_array['quake']], dtype=np.str_)
+
+
+def same_id_pairs(quake_ids):
+    """
+    :param quake_ids: np array of event ids, empty ids are ignored
+    :return: tuple of np arrays (first, second), each earthquake is paired with the first one with its id
+    """
+    _, first_rows, inverse = np.unique(quake_ids, return_index=True, return_inverse=True)
+    second = np.arange(len(quake_ids))
+    first = first_rows[inverse.ravel()]
+    keep = (first != second) & (quake_ids != "")
+    return first[keep], second[keep]
+
+
+def cluster_pairs(rows, first, second):
+    """
+    This function will group the earthquakes connected by pairs (connected components)
+    It is a vectorized union-find: each earthquake points to the smallest row of its group, pairs hook their
+    groups together and the pointers are compressed until nothing changes
+    :param rows: number of earthquakes
+    :param first: np array of row indices
+    :param second: np array of row indices
+    :return: np array with the group of each earthquake (the smallest row of the group)
+    """
+    parents = np.arange(rows)
+    if len(first) == 0:
+        return parents
+
+    while True:
+        # hook the larger root of each pair to the smaller one
+        first_roots = parents[first]
+        second_roots = parents[second]
+        smaller = np.minimum(first_roots, second_roots)
+        np.minimum.at(parents, first_roots, smaller)
+        np.minimum.at(parents, second_roots, smaller)
+
+        # path compression
+        while True:
+            compressed = parents[parents]
+            if np.array_equal(compressed, parents):
+                break
+            parents = compressed
+
+        if np.array_equal(parents[first], parents[second]):
+            return parents
+
+
+def seed_groups(rows, first, second, order):
+    """
+    This function will group the paired earthquakes around seeds, without chaining
+    The earthquakes are visited in order, an earthquake not in a group yet becomes a seed and takes the paired
+    earthquakes that are not in a group yet. Every earthquake of a group is paired with its seed, so a long
+    sequence of close events (an aftershock sequence or a swarm) is not merged into a single event
+    :param rows: number of earthquakes
+    :param first: np array of row indices
+    :param second: np array of row indices
+    :param order: np array of rows, the first ones become seeds first
+    :return: np array with the group of each earthquake (the row of its seed)
+    """
+    groups = np.full(rows, -1)
+
+    # the paired earthquakes of each row, in both directions
+    nodes = np.concatenate((first, second))
+    neighbours = np.concatenate((second, first))
+    by_node = np.argsort(nodes, kind='stable')
+    neighbours = neighbours[by_node]
+    starts = np.searchsorted(nodes[by_node], np.arange(rows + 1))
+
+    # only the rows with pairs need the sequential visit
+    for row in order[starts[order + 1] > starts[order]].tolist():
+        if groups[row] >= 0:
+            continue
+        members = neighbours[starts[row]:starts[row + 1]]
+        groups[members[groups[members] < 0]] = row
+        groups[row] = row
+
+    unpaired = groups < 0
+    groups[unpaired] = np.flatnonzero(unpaired)
+    return groups
+
+
+def preference_order(quake_array, source_priority=()):
+    """
+    :param quake_array: np array of earthquakes (QUAKE_DTYPE) or dictionary of columns
+    :param source_priority: sequence of sources (networks), the first ones are preferred
+    :return: np array of rows from the most to the least preferred: first source in source_priority, then the
+        highest significance, then the lowest row
+    """
+    sources = event_sources(quake_array)
+    ranks = np.full(len(sources), len(source_priority))
+    for rank, source in reversed(list(enumerate(source_priority))):
+        ranks[sources == source] = rank
+
+    significances = np.asarray(quake_array['significance'], dtype=np.int64)
+
+    # lexsort sorts by the last key first
+    return np.lexsort((np.arange(len(ranks)), -significances, ranks))
+
+
+def preferred_rows(quake_array, groups, source_priority=()):
+    """
+    This function will choose the earthquake kept for each group
+    The preferred one comes from the first source in source_priority, then has the highest significance,
+    then the lowest row
+    :param quake_array: np array of earthquakes (QUAKE_DTYPE) or dictionary of columns
+    :param groups: np array with the group of each earthquake
+    :param source_priority: sequence of sources (networks), the first ones are preferred
+    :return: sorted np array with the row of the preferred earthquake of each group
+    """
+    order = preference_order(quake_array, source_priority)
+    order = order[np.argsort(groups[order], kind='stable')]
+    sorted_groups = groups[order]
+    first_of_group = np.r_[True, sorted_groups[1:] != sorted_groups[:-1]][:len(order)]
+    return np.sort(order[first_of_group])
+
+
+def associate(quake_array, time_tolerance=16_000, distance_tolerance=100, magnitude_tolerance=None,
+              source_priority=()):
+    """
+    This function will group the earthquakes that are the same event and choose the one to keep
+    Earthquakes with the same id are merged first. Then the preferred earthquakes become seeds of groups, so two
+    earthquakes are only merged through a seed they are both paired with
+    :param quake_array: np array of earthquakes (QUAKE_DTYPE) or dictionary of columns
+    :param time_tolerance: maximum time difference (ms)
+    :param distance_tolerance: maximum epicentral distance (kms)
+    :param magnitude_tolerance: maximum magnitude difference, not checked if None
+    :param source_priority: sequence of sources (networks), the first ones are preferred
+    :return: tuple of (np array with the group of each earthquake, np array with the preferred rows)
+    """
+    rows = len(quake_array['time'])
+    first, second = find_duplicate_pairs(quake_array, time_tolerance, distance_tolerance, magnitude_tolerance)
+
+    # the same id is always the same event, each id is then handled as its smallest row
+    quake_ids = event_ids(quake_array)
+    id_groups = np.arange(rows) if quake_ids is None else cluster_pairs(rows, *same_id_pairs(quake_ids))
+    first = id_groups[first]
+    second = id_groups[second]
+    linked = first != second
+
+    # an id is visited at the position of its most preferred earthquake
+    roots = id_groups[preference_order(quake_array, source_priority)]
+    order = roots[np.sort(np.unique(roots, return_index=True)[1])]
+
+    groups = seed_groups(rows, first[linked], second[linked], order)[id_groups]
+    return groups, preferred_rows(quake_array, groups, source_priority)
+
+
+def deduplicate(quake_data, time_tolerance=16_000, distance_tolerance=100, magnitude_tolerance=None,
+                source_priority=()):
+    """
+    This function will remove the duplicated events of a QuakeData object, for example after merging catalogues
+    :param quake_data: QuakeData object
+    :param time_tolerance: maximum time difference (ms)
+    :param distance_tolerance: maximum epicentral distance (kms)
+    :param magnitude_tolerance: maximum magnitude difference, not checked if None
+    :param source_priority: sequence of sources (networks), the first ones are preferred
+    :return: QuakeData object with one earthquake per event, without filters
+    """
+    # a chunked catalogue is associated on its columns, only the kept earthquakes get Quake objects
+    if isinstance(quake_data, chunked_quakes.ChunkedQuakeData):
+        columns = quake_data.query_columns()
+        _, rows = associate(columns, time_tolerance, distance_tolerance, magnitude_tolerance, source_priority)
+        return earthquakes.QuakeData.from_array(
+            earthquakes.columns_to_quake_array({column: values[rows] for column, values in columns.items()}))
+
+    _, rows = associate(quake_data.quake_array, time_tolerance, distance_tolerance, magnitude_tolerance,
+                        source_priority)
+    return earthquakes.QuakeData.from_array(quake_data.quake_array[rows])
@@ -0,0 +1,301 @@
+import json
+import mmap
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+import chunked_quakes
+import earthquakes
+
+# pyarrow is optional, the numpy format is used when it is not installed
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+# magic bytes at the start of the files
+NUMPY_MAGIC = b"QUAKCOL1"
+ARROW_MAGIC = b"ARROW1"
+
+# columns start at multiples of this number of bytes, so they can be read in place
+ALIGNMENT = 64
+
+# string columns with few distinct values, the numpy format stores them as codes into a list of categories
+CATEGORY_COLUMNS = ('q_type', 'source')
+
+
+def align(offset):
+    """
+    :param offset: offset in bytes
+    :return: the next offset that is a multiple of ALIGNMENT
+    """
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def to_columns(quake_data):
+    """
+    :param quake_data: QuakeData object or np array of earthquakes (for example a filtered array)
+    :return: dictionary of column name -> np array with the QUAKE_COLUMNS dtypes
+    """
+    # a chunked catalogue is read chunk by chunk, without building the Quake objects
+    if isinstance(quake_data, chunked_quakes.ChunkedQuakeData):
+        return quake_data.query_columns()
+
+    quake_array = quake_data.quake_array if isinstance(quake_data, earthquakes.QuakeData) else quake_data
+    columns = earthquakes.quake_array_to_columns(quake_array)
+    return {column: np.ascontiguousarray(columns[column], dtype=dtype)
+            for column, dtype in earthquakes.QUAKE_COLUMNS.items()}
+
+
+def write_numpy_columns(path, columns):
+    """
+    This function will write columns in the numpy fallback format:
+    magic bytes, header length (uint64), json header with the dtype, offset and length of each column,
+    then the raw bytes of each column aligned to ALIGNMENT. The CATEGORY_COLUMNS are stored as category codes,
+    the other string columns (the ids) as fixed width UTF-8 bytes
+    :param path: path of the file
+    :param columns: dictionary of column name -> contiguous np array
+    """
+    rows = len(next(iter(columns.values()))) if columns else 0
+    header = {'rows': rows, 'columns': []}
+
+    # category columns are stored as codes into a list of categories, the ids are unique so they keep their bytes
+    stored = {}
+    for name, values in columns.items():
+        if values.dtype.kind == 'U' and name in CATEGORY_COLUMNS:
+            categories, codes = np.unique(values, return_inverse=True)
+            codes = codes.astype(np.min_scalar_type(max(len(categories) - 1, 0)))
+            stored[name] = (codes, {'categories': categories.tolist()})
+        elif values.dtype.kind == 'U':
+            stored[name] = (np.char.encode(values, 'utf-8'), {'encoding': 'utf-8'})
+        else:
+            stored[name] = (values, {})
+
+    # offsets are relative to the start of the data section
+    offset = 0
+    for name, (values, extra) in stored.items():
+        header['columns'].append({'name': name, 'dtype': values.dtype.str, 'offset': offset, 'nbytes': values.nbytes,
+                                  **extra})
+        offset = align(offset + values.nbytes)
+
+    header_bytes = json.dumps(header).encode()
+    data_start = align(len(NUMPY_MAGIC) + 8 + len(header_bytes))
+
+    with open(path, "wb") as file:
+        file.write(NUMPY_MAGIC)
+        file.write(struct.pack("<Q", len(header_bytes)))
+        file.write(header_bytes)
+        for column, (values, _) in zip(header['columns'], stored.values()):
+            file.seek(data_start + column['offset'])
+            file.write(values.tobytes())
+
+        # make sure the file covers the alignment padding of the last column
+        file.truncate(data_start + offset)
+
+
+def read_numpy_columns(path):
+    """
+    This function will read a file in the numpy fallback format without copying the numeric columns
+    The returned numeric arrays are read only views of a memory map of the file
+    :param path: path of the file
+    :return: dictionary of column name -> np array
+    """
+    with open(path, "rb") as file:
+        if file.read(len(NUMPY_MAGIC)) != NUMPY_MAGIC:
+            raise ValueError(f"{path} is not a columnar earthquake file")
+        header_length = struct.unpack("<Q", file.read(8))[0]
+        header = json.loads(file.read(header_length))
+        data_start = align(len(NUMPY_MAGIC) + 8 + header_length)
+
+        # the memory map stays open as long as one of the arrays uses it
+        buffer = None
+        if header['rows'] > 0:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    columns = {}
+    for column in header['columns']:
+        if buffer is None:
+            values = np.empty(0, dtype=np.dtype(column['dtype']))
+        else:
+            values = np.frombuffer(buffer, dtype=np.dtype(column['dtype']), count=header['rows'],
+                                   offset=data_start + column['offset'])
+
+        # string columns are decoded from their codes or their bytes (these are copies)
+        if 'categories' in column:
+            values = np.array(column['categories'] or [""], dtype=np.str_)[values]
+        elif 'encoding' in column:
+            values = np.char.decode(values, column['encoding'])
+        columns[column['name']] = values
+    return columns
+
+
+def write_arrow_columns(path, columns):
+    """
+    This function will write columns as an Arrow IPC file
+    :param path: path of the file
+    :param columns: dictionary of column name -> np array
+    """
+    table = pyarrow.table({name: pyarrow.array(values) for name, values in columns.items()})
+    with pyarrow.OSFile(str(path), "wb") as sink:
+        with pyarrow.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_arrow_columns(path):
+    """
+    This function will read an Arrow IPC file through a memory map
+    Numeric columns without nulls are returned without a copy
+    :param path: path of the file
+    :return: dictionary of column name -> np array
+    """
+    table = pyarrow.ipc.open_file(pyarrow.memory_map(str(path), "r")).read_all()
+
+    columns = {}
+    for name in table.column_names:
+        values = table.column(name).combine_chunks()
+        if pyarrow.types.is_string(values.type) or pyarrow.types.is_large_string(values.type):
+            columns[name] = np.array(values.to_pylist(), dtype=np.str_)
+        else:
+            columns[name] = values.to_numpy(zero_copy_only=False)
+    return columns
+
+
+def export_quake_data(quake_data, path, file_format="auto"):
+    """
+    This function will export earthquakes to a columnar binary file
+    :param quake_data: QuakeData object or np array of earthquakes (for example a filtered array)
+    :param path: path of the file
+    :param file_format: "arrow", "numpy" or "auto" (arrow if pyarrow is installed, numpy otherwise)
+    :return: the format used
+    """
+    if file_format == "auto":
+        file_format = "arrow" if pyarrow is not None else "numpy"
+
+    columns = to_columns(quake_data)
+    if file_format == "arrow":
+        if pyarrow is None:
+            raise ValueError("pyarrow is not installed")
+        write_arrow_columns(path, columns)
+    elif file_format == "numpy":
+        write_numpy_columns(path, columns)
+    else:
+        raise ValueError(f"Unknown format {file_format}")
+    return file_format
+
+
+def import_columns(path):
+    """
+    This function will read the columns of a file written by export_quake_data, the format is detected
+    :param path: path of the file
+    :return: dictionary of column name -> np array with the QUAKE_COLUMNS dtypes
+    """
+    with open(path, "rb") as file:
+        magic = file.read(len(NUMPY_MAGIC))
+
+    if magic == NUMPY_MAGIC:
+        columns = read_numpy_columns(path)
+    elif magic.startswith(ARROW_MAGIC):
+        if pyarrow is None:
+            raise ValueError("pyarrow is needed to read Arrow files")
+        columns = read_arrow_columns(path)
+    else:
+        raise ValueError(f"{path} is not a columnar earthquake file")
+
+    # files written before ids were kept have no id and source columns
+    rows = len(columns['time'])
+    for column in ('id', 'source'):
+        if column not in columns:
+            columns[column] = np.full(rows, "", dtype=np.str_)
+
+    # astype does not copy when the dtype already matches
+    return {column: columns[column].astype(dtype, copy=False) if dtype is not np.str_ else columns[column]
+            for column, dtype in earthquakes.QUAKE_COLUMNS.items()}
+
+
+def import_quake_data(path):
+    """
+    This function will load a QuakeData object from a file written by export_quake_data
+    :param path: path of the file
+    :return: QuakeData object
+    """
+    return earthquakes.QuakeData.from_array(earthquakes.columns_to_quake_array(import_columns(path)))
+
+
+def quake_array_to_geojson(quake_array):
+    """
+    This function will convert earthquakes back to a geojson dictionary (accepted by QuakeData)
+    :param quake_array: np array of earthquakes
+    :return: dictionary in the geojson format
+    """
+    features = []
+    for quake in quake_array['quake']:
+        features.append({
+            "type": "Feature",
+            "properties": {"mag": quake.mag, "time": quake.time, "felt": quake.felt, "sig": quake.sig,
+                           "type": quake.q_type, "magType": None, "net": quake.source},
+            "geometry": {"type": "Point", "coordinates": [quake.lat, quake.lon, quake.depth]},
+            "id": quake.id
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def compare_with_geojson(quake_data, directory=None):
+    """
+    This function will compare the size and the write/read time of the columnar formats with GeoJSON
+    :param quake_data: QuakeData object or np array of earthquakes
+    :param directory: directory for the temporary files, a new temporary directory if not provided
+    :return: dictionary of format -> {'bytes', 'write_seconds', 'read_seconds'}
+    """
+    quake_array = quake_data.quake_array if isinstance(quake_data, earthquakes.QuakeData) else quake_data
+    formats = ["geojson", "numpy"] + (["arrow"] if pyarrow is not None else [])
+    results = {}
+
+    with tempfile.TemporaryDirectory(dir=directory) as temp_dir:
+        for file_format in formats:
+            path = Path(temp_dir) / f"quakes.{file_format}"
+
+            start = time.perf_counter()
+            if file_format == "geojson":
+                path.write_text(json.dumps(quake_array_to_geojson(quake_array)))
+            else:
+                export_quake_data(quake_array, path, file_format)
+            write_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            if file_format == "geojson":
+                loaded = earthquakes.QuakeData(json.loads(path.read_text()))
+            else:
+                loaded = import_quake_data(path)
+            read_seconds = time.perf_counter() - start
+
+            if len(loaded.quake_array) != len(quake_array):
+                raise ValueError(f"{file_format} round trip lost earthquakes")
+
+            results[file_format] = {'bytes': path.stat().st_size, 'write_seconds': write_seconds,
+                                    'read_seconds': read_seconds}
+            del loaded
+
+    return results
+
+
+def main(argv):
+    # compare the formats on a geojson file
+    path = Path(argv[0] if argv else "./earthquakes.geojson")
+    if not path.exists():
+        print("File doesnt exist")
+        sys.exit()
+
+    quake_data = earthquakes.QuakeData(json.loads(path.read_text()))
+    print(f"{len(quake_data.quake_array)} earthquakes")
+    for file_format, result in compare_with_geojson(quake_data).items():
+        print(f"{file_format:>8}: {result['bytes']:>12,} bytes, write {result['write_seconds'] * 1000:8.1f} ms, "
+              f"read {result['read_seconds'] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
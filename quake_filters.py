@@ -0,0 +1,817 @@
+import math
+
+import numpy as np
+
+import earthquakes
+
+
+class QuakeFilter:
+    """
+    Base class of the immutable filters used by QuakeData.query
+    Filters are hashable so they can be used as cache keys, and combined with & (and) and | (or)
+    A filter works on any mapping of column name -> np array: a QuakeData np array or the columns of a chunk
+    """
+    __slots__ = ()
+
+    # relative cost of evaluating the filter, cheap filters are evaluated first when combined
+    cost = 1
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def key(self):
+        """
+        :return: tuple that identifies the filter, used for equality and hashing
+        """
+        raise NotImplementedError
+
+    def mask(self, columns):
+        """
+        This function will evaluate the filter
+        :param columns: QuakeData np array or dictionary of column name -> np array
+        :return: np array of booleans, True for the rows that pass the filter
+        """
+        raise NotImplementedError
+
+    def may_match(self, zone_map):
+        """
+        This function will use the min/max of each column of a chunk to decide if any row could pass
+        :param zone_map: dictionary of column name -> [min, max]
+        :return: False only if no row of the chunk can pass the filter
+        """
+        return True
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash((type(self).__name__, self.key()))
+
+    def __repr__(self):
+        return f"{type(self).__name__}{self.key()}"
+
+    def __and__(self, other):
+        return AndFilter(self, other)
+
+    def __or__(self, other):
+        return OrFilter(self, other)
+
+
+class LocationFilter(QuakeFilter):
+    __slots__ = ('latitude', 'longitude', 'distance')
+    cost = 3
+
+    def __init__(self, latitude, longitude, distance):
+        """
+        Earthquakes at a maximum distance of a point
+        :param latitude: Latitude of the point
+        :param longitude: longitude of the point
+        :param distance: Maximum distance to the point (kms)
+        """
+        try:
+            object.__setattr__(self, 'latitude', float(earthquakes.ensure_numeric(latitude)))
+            object.__setattr__(self, 'longitude', float(earthquakes.ensure_numeric(longitude)))
+            object.__setattr__(self, 'distance', float(earthquakes.ensure_numeric(distance)))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid/Missing parameters")
+
+    def key(self):
+        return self.latitude, self.longitude, self.distance
+
+    def mask(self, columns):
+        return earthquakes.calc_distance_array(columns['lat'], columns['long'],
+                                               self.latitude, self.longitude) <= self.distance
+
+    def may_match(self, zone_map):
+        # the latitude difference alone is a lower bound of the haversine distance
+        lat_min, lat_max = zone_map['lat']
+        lat_gap = max(lat_min - self.latitude, self.latitude - lat_max, 0)
+        return earthquakes.EARTH_RADIUS_KM * math.radians(lat_gap) <= self.distance
+
+
+class PropertyFilter(QuakeFilter):
+    __slots__ = ('magnitude', 'felt', 'significance')
+
+    def __init__(self, magnitude=None, felt=None, significance=None):
+        """
+        Earthquakes with a minimum magnitude, felt and significance
+        Parameters not provided are set to 0, at least one must be valid
+        :param magnitude: magnitude of the earthquake
+        :param felt: number of reports
+        :param significance: number of how significant was the earthquake
+        """
+        values = []
+        for value in (magnitude, felt, significance):
+            try:
+                values.append(None if value is None else float(value))
+            except (TypeError, ValueError):
+                values.append(None)
+
+        if all(value is None for value in values):
+            raise ValueError("Invalid/Missing parameters")
+
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, 0.0 if value is None else value)
+
+    def key(self):
+        return self.magnitude, self.felt, self.significance
+
+    def mask(self, columns):
+        return ((columns['felt'] >= self.felt) &
+                (columns['magnitude'] >= self.magnitude) &
+                (columns['significance'] >= self.significance))
+
+    def may_match(self, zone_map):
+        return zone_map['magnitude'][1] >= self.magnitude and zone_map['significance'][1] >= self.significance
+
+
+class TimeFilter(QuakeFilter):
+    __slots__ = ('start', 'end')
+
+    def __init__(self, start=None, end=None):
+        """
+        Earthquakes that happened between two times (inclusive)
+        :param start: earliest time, milliseconds since the epoch (same as the geojson 'time')
+        :param end: latest time, milliseconds since the epoch
+        """
+        if start is None and end is None:
+            raise ValueError("Invalid/Missing parameters")
+        try:
+            object.__setattr__(self, 'start', None if start is None else int(earthquakes.ensure_numeric(start)))
+            object.__setattr__(self, 'end', None if end is None else int(earthquakes.ensure_numeric(end)))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid/Missing parameters")
+
+    def key(self):
+        return self.start, self.end
+
+    def mask(self, columns):
+        times = columns['time']
+        mask = np.ones(len(times), dtype=bool)
+        if self.start is not None:
+            mask &= times >= self.start
+        if self.end is not None:
+            mask &= times <= self.end
+        return mask
+
+    def may_match(self, zone_map):
+        time_min, time_max = zone_map['time']
+        return ((self.start is None or time_max >= self.start) and
+                (self.end is None or time_min <= self.end))
+
+
+class DepthFilter(QuakeFilter):
+    __slots__ = ('min_depth', 'max_depth')
+
+    def __init__(self, min_depth=None, max_depth=None):
+        """
+        Earthquakes with a depth inside a range (inclusive)
+        :param min_depth: minimum depth (kms), None for no minimum
+        :param max_depth: maximum depth (kms), None for no maximum
+        """
+        if min_depth is None and max_depth is None:
+            raise ValueError("Invalid/Missing parameters")
+        try:
+            object.__setattr__(self, 'min_depth',
+                               None if min_depth is None else float(earthquakes.ensure_numeric(min_depth)))
+            object.__setattr__(self, 'max_depth',
+                               None if max_depth is None else float(earthquakes.ensure_numeric(max_depth)))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid/Missing parameters")
+
+    def key(self):
+        return self.min_depth, self.max_depth
+
+    def mask(self, columns):
+        depths = columns['depth']
+        mask = np.ones(len(depths), dtype=bool)
+        if self.min_depth is not None:
+            mask &= depths >= self.min_depth
+        if self.max_depth is not None:
+            mask &= depths <= self.max_depth
+        return mask
+
+    def may_match(self, zone_map):
+        depth_min, depth_max = zone_map['depth']
+        return ((self.min_depth is None or depth_max >= self.min_depth) and
+                (self.max_depth is None or depth_min <= self.max_depth))
+
+
+class HypocentralFilter(QuakeFilter):
+    __slots__ = ('latitude', 'longitude', 'depth', 'distance')
+    cost = 3
+
+    def __init__(self, latitude, longitude, depth, distance):
+        """
+        Earthquakes at a maximum straight line (3D) distance of a site, using the depth of each earthquake
+        :param latitude: Latitude of the site
+        :param longitude: longitude of the site
+        :param depth: depth of the site (kms), negative values for elevations
+        :param distance: Maximum distance to the site (kms)
+        """
+        try:
+            for name, value in zip(self.__slots__, (latitude, longitude, depth, distance)):
+                object.__setattr__(self, name, float(earthquakes.ensure_numeric(value)))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid/Missing parameters")
+
+    def key(self):
+        return self.latitude, self.longitude, self.depth, self.distance
+
+    def mask(self, columns):
+        depths = columns['depth']
+
+        # the depth difference alone is a lower bound of the distance, only the rest need the full formula
+        candidates = np.flatnonzero(np.abs(depths - self.depth) <= self.distance)
+        mask = np.zeros(len(depths), dtype=bool)
+        mask[candidates] = earthquakes.calc_hypocentral_distance_array(
+            columns['lat'][candidates], columns['long'][candidates], depths[candidates],
+            self.latitude, self.longitude, self.depth) <= self.distance
+        return mask
+
+    def may_match(self, zone_map):
+        depth_min, depth_max = zone_map['depth']
+        if max(depth_min - self.depth, self.depth - depth_max, 0) > self.distance:
+            return False
+
+        # chord between the closest latitudes, on the smallest sphere the points can be on
+        lat_min, lat_max = zone_map['lat']
+        lat_gap = math.radians(max(lat_min - self.latitude, self.latitude - lat_max, 0))
+        radius = earthquakes.EARTH_RADIUS_KM - max(depth_max, self.depth)
+        return 2 * radius * math.sin(min(lat_gap, math.pi) / 2) <= self.distance
+
+
+class ColumnSubset:
+    def __init__(self, columns, indices):
+        """
+        Lazy view of some rows of the columns, a column is only indexed when a filter reads it
+        :param columns: QuakeData np array or dictionary of column name -> np array
+        :param indices: np array of row indices
+        """
+        self.columns = columns
+        self.indices = indices
+        self._cache = {}
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            self._cache[name] = self.columns[name][self.indices]
+        return self._cache[name]
+
+    def __len__(self):
+        return len(self.indices)
+
+
+def number_of_rows(columns):
+    """
+    :param columns: QuakeData np array, ColumnSubset or dictionary of column name -> np array
+    :return: number of rows
+    """
+    if isinstance(columns, dict):
+        return len(next(iter(columns.values())))
+    return len(columns)
+
+
+class AndFilter(QuakeFilter):
+    __slots__ = ('filters',)
+
+    def __init__(self, *filters):
+        """
+        Earthquakes that pass all the filters
+        Filters are evaluated from cheapest to most expensive, each only on the rows that passed the previous ones
+        :param filters: QuakeFilter objects
+        """
+        if not filters:
+            raise ValueError("Invalid/Missing parameters")
+
+        # flatten nested and filters
+        flat_filters = []
+        for quake_filter in filters:
+            flat_filters.extend(quake_filter.filters if isinstance(quake_filter, AndFilter) else [quake_filter])
+        object.__setattr__(self, 'filters', tuple(flat_filters))
+
+    @property
+    def cost(self):
+        return sum(quake_filter.cost for quake_filter in self.filters)
+
+    def key(self):
+        return self.filters
+
+    def mask(self, columns):
+        mask = np.zeros(number_of_rows(columns), dtype=bool)
+        indices = np.arange(len(mask))
+
+        for quake_filter in sorted(self.filters, key=lambda quake_filter: quake_filter.cost):
+            indices = indices[quake_filter.mask(ColumnSubset(columns, indices))]
+            if len(indices) == 0:
+                break
+
+        mask[indices] = True
+        return mask
+
+    def may_match(self, zone_map):
+        return all(quake_filter.may_match(zone_map) for quake_filter in self.filters)
+
+
+class OrFilter(QuakeFilter):
+    __slots__ = ('filters',)
+
+    def __init__(self, *filters):
+        """
+        Earthquakes that pass at least one of the filters
+        Each filter is only evaluated on the rows that did not pass the previous ones
+        :param filters: QuakeFilter objects
+        """
+        if not filters:
+            raise ValueError("Invalid/Missing parameters")
+
+        # flatten nested or filters
+        flat_filters = []
+        for quake_filter in filters:
+            flat_filters.extend(quake_filter.filters if isinstance(quake_filter, OrFilter) else [quake_filter])
+        object.__setattr__(self, 'filters', tuple(flat_filters))
+
+    @property
+    def cost(self):
+        return sum(quake_filter.cost for quake_filter in self.filters)
+
+    def key(self):
+        return self.filters
+
+    def mask(self, columns):
+        mask = np.zeros(number_of_rows(columns), dtype=bool)
+        remaining = np.arange(len(mask))
+
+        for quake_filter in sorted(self.filters, key=lambda quake_filter: quake_filter.cost):
+            passed = quake_filter.mask(ColumnSubset(columns, remaining))
+            mask[remaining[passed]] = True
+            remaining = remaining[~passed]
+            if len(remaining) == 0:
+                break
+
+        return mask
+
+    def may_match(self, zone_map):
+        return any(quake_filter.may_match(zone_map) for quake_filter in self.filters)
+
+
+def bbox_may_match(zone_map, lat_min, long_min, lat_max, long_max):
+    """
+    :param zone_map: dictionary of column name -> [min, max]
+    :return: False if the chunk does not overlap the bounding box
+    """
+    return (zone_map['lat'][0] <= lat_max and zone_map['lat'][1] >= lat_min and
+            zone_map['long'][0] <= long_max and zone_map['long'][1] >= long_min)
+
+
+class BBoxFilter(QuakeFilter):
+    __slots__ = ('lat_min', 'long_min', 'lat_max', 'long_max')
+
+    def __init__(self, lat_min, long_min, lat_max, long_max):
+        """
+        Earthquakes inside a latitude/longitude box (inclusive)
+        If long_min is larger than long_max the box crosses the antimeridian
+        :param lat_min: minimum latitude
+        :param long_min: minimum (western) longitude
+        :param lat_max: maximum latitude
+        :param long_max: maximum (eastern) longitude
+        """
+        try:
+            values = [float(earthquakes.ensure_numeric(value)) for value in (lat_min, long_min, lat_max, long_max)]
+        except (TypeError, ValueError):
+            raise ValueError("Invalid/Missing parameters")
+        if values[0] > values[2]:
+            raise ValueError("lat_min must not be larger than lat_max")
+
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def key(self):
+        return self.lat_min, self.long_min, self.lat_max, self.long_max
+
+    def mask(self, columns):
+        lats = columns['lat']
+        longs = columns['long']
+        mask = (lats >= self.lat_min) & (lats <= self.lat_max)
+        if self.long_min <= self.long_max:
+            return mask & (longs >= self.long_min) & (longs <= self.long_max)
+        return mask & ((longs >= self.long_min) | (longs <= self.long_max))
+
+    def may_match(self, zone_map):
+        if self.long_min > self.long_max:
+            return zone_map['lat'][0] <= self.lat_max and zone_map['lat'][1] >= self.lat_min
+        return bbox_may_match(zone_map, self.lat_min, self.long_min, self.lat_max, self.long_max)
+
+
+def parse_vertices(vertices, minimum):
+    """
+    This function will validate a list of (lat, long) vertices
+    :param vertices: sequence or np array of (lat, long) pairs
+    :param minimum: minimum number of vertices
+    :return: tuple of (lat, long) tuples of floats
+    """
+    if isinstance(vertices, np.ndarray):
+        if vertices.ndim != 2 or vertices.shape[1] != 2:
+            raise ValueError("Invalid/Missing parameters")
+        values = vertices.ravel()
+    else:
+        try:
+            pairs = [tuple(vertex) for vertex in vertices]
+        except TypeError:
+            raise ValueError("Invalid/Missing parameters")
+        if any(len(pair) != 2 for pair in pairs):
+            raise ValueError("Invalid/Missing parameters")
+        values = [value for pair in pairs for value in pair]
+
+    # convert all the coordinates at once
+    values, valid, _ = earthquakes.coerce_numeric_array(values)
+    if not valid.all():
+        raise ValueError("Invalid/Missing parameters")
+
+    vertices = tuple(map(tuple, values.reshape(-1, 2).tolist()))
+    if len(vertices) < minimum:
+        raise ValueError(f"At least {minimum} vertices are needed")
+    return vertices
+
+
+def unwrap_longitudes(longs):
+    """
+    This function will remove the jumps of more than 180 degrees between consecutive longitudes, so a line crossing
+    the antimeridian stays continuous (the longitudes can then go past 180 or -180)
+    :param longs: np array of longitudes
+    :return: np array of longitudes, the first one is unchanged
+    """
+    return np.unwrap(longs, period=360)
+
+
+def longitude_shifts(long_min, long_max):
+    """
+    :param long_min: minimum longitude of a shape, can be less than -180 for shapes crossing the antimeridian
+    :param long_max: maximum longitude of a shape, can be more than 180 for shapes crossing the antimeridian
+    :return: list of the shifts to add to longitudes in [-180, 180] to test them against every part of the shape
+    """
+    shifts = [0.0]
+    if long_max > 180:
+        shifts.append(360.0)
+    if long_min < -180:
+        shifts.append(-360.0)
+    return shifts
+
+
+def unwrap_ring(vertices):
+    """
+    :param vertices: np array of (lat, long) vertices of a ring
+    :return: np array of vertices with continuous longitudes, the ring is used as given if it goes around a pole
+    """
+    longs = unwrap_longitudes(np.append(vertices[:, 1], vertices[0, 1]))
+    if not np.isclose(longs[-1], longs[0]):
+        return vertices
+    return np.column_stack((vertices[:, 0], longs[:-1]))
+
+
+def edges_crossed(lats, longs, edges):
+    """
+    This function will check, for every point and edge, if a ray from the point towards increasing
+    latitude crosses the edge (even-odd rule)
+    :param lats: np array of point latitudes
+    :param longs: np array of point longitudes
+    :param edges: np array of shape (n, 4) with lat1, long1, lat2, long2 of each edge
+    :return: np array of booleans, True for the points that cross an odd number of edges
+    """
+    lat1, long1, lat2, long2 = edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+    lats = lats[:, np.newaxis]
+    longs = longs[:, np.newaxis]
+
+    # the edge spans the longitude of the point and the crossing is ahead of the point
+    spans = (long1 > longs) != (long2 > longs)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing_lat = lat1 + (longs - long1) * (lat2 - lat1) / (long2 - long1)
+    crosses = spans & (lats < crossing_lat)
+
+    return np.count_nonzero(crosses, axis=1) % 2 == 1
+
+
+class PolygonFilter(QuakeFilter):
+    __slots__ = ('rings', '_edges', '_bbox', '_grid')
+    cost = 5
+
+    # maximum number of point/edge pairs compared at once
+    block_size = 1_000_000
+
+    def __init__(self, exterior, holes=(), grid_size='auto'):
+        """
+        Earthquakes inside a polygon, using (lat, long) vertices in the same order as the QuakeData columns
+        Points outside of the polygon bounding box are discarded first. With grid_size the bounding box is divided
+        in a grid of cells, cells fully inside or outside the polygon are decided at once and only the points in
+        cells crossed by an edge are tested against the edges of their row of cells
+        Rings crossing the antimeridian are supported, rings around a pole are used as given (they only match
+        points inside the ring drawn on a flat lat/long map). The rings must not cross each other
+        :param exterior: sequence of (lat, long) vertices of the outer ring, closing it is optional
+        :param holes: sequence of rings (sequences of vertices) cut out of the polygon
+        :param grid_size: number of rows and columns of the grid, 'auto' to size it from the number of edges,
+            None to test the points against all the edges
+        """
+        rings = tuple(parse_vertices(ring, 3) for ring in (exterior, *holes))
+        object.__setattr__(self, 'rings', rings)
+
+        # rings crossing the antimeridian are unwrapped to longitudes past 180, the holes are moved next to the
+        # exterior ring
+        ring_arrays = [unwrap_ring(np.array(ring)) for ring in rings]
+        if ring_arrays[0][:, 1].min() < -180:
+            ring_arrays[0][:, 1] += 360
+        exterior_center = ring_arrays[0][:, 1].mean()
+        for ring in ring_arrays[1:]:
+            ring[:, 1] -= 360 * np.round((ring[:, 1].mean() - exterior_center) / 360)
+
+        # edges of all the rings, holes are handled by the even-odd rule
+        edges = np.vstack([np.hstack((ring, np.roll(ring, -1, axis=0))) for ring in ring_arrays])
+        object.__setattr__(self, '_edges', edges)
+
+        bbox = (*ring_arrays[0].min(axis=0), *ring_arrays[0].max(axis=0))
+        object.__setattr__(self, '_bbox', bbox)
+
+        if grid_size == 'auto':
+            grid_size = int(np.clip(len(edges) // 2, 16, 2048))
+        object.__setattr__(self, '_grid', None if grid_size is None else self._build_grid(grid_size))
+
+    def _build_grid(self, grid_size):
+        lat_min, long_min, lat_max, long_max = self._bbox
+        lat_step = (lat_max - lat_min) / grid_size or 1
+        long_step = (long_max - long_min) / grid_size or 1
+        edges = self._edges
+        edge_long_min = np.minimum(edges[:, 1], edges[:, 3])
+        edge_long_max = np.maximum(edges[:, 1], edges[:, 3])
+
+        # the ray from a point moves along latitude, so it can only cross edges in its longitude row of cells.
+        # One entry per edge and row it touches
+        long_cells = np.clip(((edges[:, [1, 3]] - long_min) / long_step).astype(int), 0, grid_size - 1)
+        first_rows = long_cells.min(axis=1)
+        counts = long_cells.max(axis=1) - first_rows + 1
+        entry_edges = np.repeat(np.arange(len(edges)), counts)
+        entry_rows = np.repeat(first_rows, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                                                           counts)
+        row_starts = long_min + entry_rows * long_step
+        row_ends = row_starts + long_step
+
+        # edges going through the whole row (with a margin for rounding) never cross each other inside of it, so
+        # they are sorted by latitude and the crossings of a ray are found with a binary search.
+        # The other edges of the row are tested one by one
+        margin = long_step * 1e-9
+        through = (edge_long_min[entry_edges] < row_starts - margin) & (edge_long_max[entry_edges] > row_ends + margin)
+        lat1, long1, lat2, long2 = edges[entry_edges].T
+        slopes = (lat2 - lat1) / np.where(long1 == long2, 1, long2 - long1)
+        order = np.lexsort((lat1 + (row_starts + long_step / 2 - long1) * slopes, ~through, entry_rows))
+        through_rows = entry_rows[order][through[order]]
+        other_rows = entry_rows[order][~through[order]]
+        tables = (np.stack((lat1, long1, slopes))[:, order[through[order]]],
+                  np.searchsorted(through_rows, np.arange(grid_size + 1)),
+                  np.stack((lat1, long1, long2, slopes))[:, order[~through[order]]],
+                  np.searchsorted(other_rows, np.arange(grid_size + 1)))
+
+        # cells touched by the part of each edge in each row, found from its latitudes at the row limits
+        row_limits = np.clip(np.column_stack((row_starts, row_ends)), edge_long_min[entry_edges, np.newaxis],
+                             edge_long_max[entry_edges, np.newaxis])
+        limit_lats = lat1[:, np.newaxis] + (row_limits - long1[:, np.newaxis]) * slopes[:, np.newaxis]
+        vertical = long1 == long2
+        limit_lats[vertical] = np.column_stack((lat1, lat2))[vertical]
+        lat_margin = lat_step * 1e-9
+        first_cells = np.clip(((limit_lats.min(axis=1) - lat_margin - lat_min) / lat_step).astype(int), 0,
+                              grid_size - 1)
+        counts = np.clip(((limit_lats.max(axis=1) + lat_margin - lat_min) / lat_step).astype(int), 0,
+                         grid_size - 1) - first_cells + 1
+        boundary = np.zeros((grid_size, grid_size), dtype=bool)
+        boundary[np.repeat(first_cells, counts) + np.arange(counts.sum()) -
+                 np.repeat(np.cumsum(counts) - counts, counts), np.repeat(entry_rows, counts)] = True
+
+        # cells without edges are completely inside or outside, their center decides. The crossings of the ray from
+        # a center are the edges of the row above it, counted from the top of the grid
+        center_longs = long_min + (entry_rows + 0.5) * long_step
+        spans = (long1 > center_longs) != (long2 > center_longs)
+        crossing_lats = lat1[spans] + (center_longs[spans] - long1[spans]) * slopes[spans]
+        crossing_cells = np.clip(np.floor((crossing_lats - lat_min) / lat_step).astype(int), -1, grid_size - 1)
+        crossing_cells -= crossing_lats <= lat_min + (crossing_cells + 0.5) * lat_step
+        crossings = np.zeros((grid_size + 1, grid_size), dtype=np.int64)
+        np.add.at(crossings, (crossing_cells + 1, entry_rows[spans]), 1)
+        inside = np.cumsum(crossings[::-1], axis=0)[::-1][1:] % 2 == 1
+
+        # 0 outside, 1 inside, 2 needs the exact test
+        states = np.where(boundary, 2, inside.astype(np.int8)).astype(np.int8)
+        return grid_size, lat_step, long_step, states, tables
+
+    def _crossed(self, lats, longs, rows, tables):
+        """
+        :param lats: np array of point latitudes
+        :param longs: np array of point longitudes
+        :param rows: np array with the row of cells of each point
+        :param tables: edges going through each row sorted by latitude (first lat, first long and slope), the
+            other edges of each row (lat1, long1, lat2, long2), and the offsets of the rows in both
+        :return: np array of booleans, True for the points that cross an odd number of edges
+        """
+        (through_lats, through_longs, through_slopes), through_offsets, other_edges, other_offsets = tables
+
+        # binary search of the first edge going through the row above each point, all the points move together
+        lows = through_offsets[rows]
+        highs = through_offsets[rows + 1]
+        crossings = highs.copy()
+        last = max(len(through_lats) - 1, 0)
+        for _ in range(int((highs - lows).max(initial=0)).bit_length()):
+            middles = (lows + highs) // 2
+            searching = lows < highs
+            edge = np.minimum(middles, last)
+            above = lats < through_lats[edge] + (longs - through_longs[edge]) * through_slopes[edge]
+            highs = np.where(searching & above, middles, highs)
+            lows = np.where(searching & ~above, middles + 1, lows)
+        crossings -= lows
+
+        # the other edges of the row, in blocks of point/edge pairs
+        starts = other_offsets[rows]
+        counts = other_offsets[rows + 1] - starts
+        ends = np.cumsum(counts)
+        block_start = 0
+        while block_start < len(rows):
+            block_end = int(np.searchsorted(ends, ends[block_start] - counts[block_start] + self.block_size,
+                                            side='right'))
+            block_end = min(max(block_end, block_start + 1), len(rows))
+            block_counts = counts[block_start:block_end]
+            points = np.repeat(np.arange(block_start, block_end), block_counts)
+            edge_indices = np.repeat(starts[block_start:block_end] - np.cumsum(block_counts) + block_counts,
+                                     block_counts) + np.arange(len(points))
+
+            lat1, long1, long2, slopes = other_edges[:, edge_indices]
+            point_longs = longs[points]
+            crosses = (long1 > point_longs) != (long2 > point_longs)
+            crosses &= lats[points] < lat1 + (point_longs - long1) * slopes
+            crossings[block_start:block_end] += np.bincount(points[crosses] - block_start,
+                                                            minlength=block_end - block_start)
+            block_start = block_end
+
+        return crossings % 2 == 1
+
+    def key(self):
+        return self.rings
+
+    def _exact(self, lats, longs, edges):
+        result = np.zeros(len(lats), dtype=bool)
+        if len(edges) == 0:
+            return result
+
+        # bounded memory for large point sets and detailed polygons
+        step = max(1, self.block_size // len(edges))
+        for start in range(0, len(lats), step):
+            result[start:start + step] = edges_crossed(lats[start:start + step], longs[start:start + step], edges)
+        return result
+
+    def _mask(self, lats, longs):
+        lat_min, long_min, lat_max, long_max = self._bbox
+
+        # bounding box prefilter
+        mask = (lats >= lat_min) & (lats <= lat_max) & (longs >= long_min) & (longs <= long_max)
+        candidates = np.flatnonzero(mask)
+        lats = lats[candidates]
+        longs = longs[candidates]
+
+        if self._grid is None:
+            mask[candidates] = self._exact(lats, longs, self._edges)
+            return mask
+
+        grid_size, lat_step, long_step, states, tables = self._grid
+        lat_cells = np.clip(((lats - lat_min) / lat_step).astype(int), 0, grid_size - 1)
+        long_cells = np.clip(((longs - long_min) / long_step).astype(int), 0, grid_size - 1)
+        candidate_states = states[lat_cells, long_cells]
+        mask[candidates] = candidate_states == 1
+
+        # points in cells crossed by edges
+        undecided = np.flatnonzero(candidate_states == 2)
+        mask[candidates[undecided]] = self._crossed(lats[undecided], longs[undecided], long_cells[undecided], tables)
+        return mask
+
+    def mask(self, columns):
+        lats = np.asarray(columns['lat'], dtype=np.float64)
+        longs = np.asarray(columns['long'], dtype=np.float64)
+        mask = self._mask(lats, longs)
+
+        # a polygon crossing the antimeridian goes past 180, the points are tested again moved by 360 degrees
+        for shift in longitude_shifts(self._bbox[1], self._bbox[3])[1:]:
+            remaining = np.flatnonzero(~mask)
+            mask[remaining] = self._mask(lats[remaining], longs[remaining] + shift)
+        return mask
+
+    def may_match(self, zone_map):
+        lat_min, long_min, lat_max, long_max = self._bbox
+        return any(bbox_may_match(zone_map, lat_min, long_min - shift, lat_max, long_max - shift)
+                   for shift in longitude_shifts(long_min, long_max))
+
+
+class MultiPolygonFilter(QuakeFilter):
+    __slots__ = ('polygons',)
+    cost = 5
+
+    def __init__(self, polygons, grid_size='auto'):
+        """
+        Earthquakes inside any of the polygons
+        :param polygons: sequence of PolygonFilter objects or of (exterior, holes) pairs
+        :param grid_size: grid size used for the polygons given as vertices
+        """
+        polygons = tuple(polygon if isinstance(polygon, PolygonFilter) else PolygonFilter(*polygon,
+                                                                                           grid_size=grid_size)
+                         for polygon in polygons)
+        if not polygons:
+            raise ValueError("Invalid/Missing parameters")
+        object.__setattr__(self, 'polygons', polygons)
+
+    def key(self):
+        return self.polygons
+
+    def mask(self, columns):
+        return OrFilter(*self.polygons).mask(columns)
+
+    def may_match(self, zone_map):
+        return any(polygon.may_match(zone_map) for polygon in self.polygons)
+
+
+class CorridorFilter(QuakeFilter):
+    __slots__ = ('polyline', 'width', '_vertices', '_bbox')
+    cost = 4
+
+    def __init__(self, polyline, width):
+        """
+        Earthquakes at a maximum distance of a polyline (for example a pipeline), using (lat, long) vertices
+        Each segment is measured in a local equirectangular projection, which is accurate for segments of up to a
+        few hundred kilometers. Segments crossing the antimeridian take the short way around
+        :param polyline: sequence of (lat, long) vertices
+        :param width: maximum distance to the polyline (kms)
+        """
+        object.__setattr__(self, 'polyline', parse_vertices(polyline, 2))
+        try:
+            object.__setattr__(self, 'width', float(earthquakes.ensure_numeric(width)))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid/Missing parameters")
+
+        vertices = np.array(self.polyline)
+        vertices[:, 1] = unwrap_longitudes(vertices[:, 1])
+        object.__setattr__(self, '_vertices', tuple(map(tuple, vertices.tolist())))
+
+        # bounding box of the polyline grown by the width
+        lat_margin = math.degrees(self.width / earthquakes.EARTH_RADIUS_KM)
+        lat_min = vertices[:, 0].min() - lat_margin
+        lat_max = vertices[:, 0].max() + lat_margin
+        long_margin = self._long_margin(lat_min, lat_max, lat_margin)
+        object.__setattr__(self, '_bbox', (lat_min, vertices[:, 1].min() - long_margin,
+                                           lat_max, vertices[:, 1].max() + long_margin))
+
+    @staticmethod
+    def _long_margin(lat_min, lat_max, lat_margin):
+        # degrees of longitude shrink towards the poles
+        cos_lat = math.cos(math.radians(min(max(abs(lat_min), abs(lat_max)), 89.9)))
+        return 360.0 if lat_min <= -89.9 or lat_max >= 89.9 else lat_margin / cos_lat
+
+    def key(self):
+        return self.polyline, self.width
+
+    def _mask(self, lats, longs):
+        mask = np.zeros(len(lats), dtype=bool)
+        km_per_degree = math.radians(earthquakes.EARTH_RADIUS_KM)
+        lat_margin = self.width / km_per_degree
+
+        for (lat1, long1), (lat2, long2) in zip(self._vertices[:-1], self._vertices[1:]):
+            # only the points still outside of the corridor and inside the segment bounding box
+            seg_lat_min, seg_lat_max = min(lat1, lat2) - lat_margin, max(lat1, lat2) + lat_margin
+            long_margin = self._long_margin(seg_lat_min, seg_lat_max, lat_margin)
+            candidates = np.flatnonzero(~mask & (lats >= seg_lat_min) & (lats <= seg_lat_max) &
+                                        (longs >= min(long1, long2) - long_margin) &
+                                        (longs <= max(long1, long2) + long_margin))
+            if len(candidates) == 0:
+                continue
+
+            # local projection in kilometers centered on the first vertex
+            cos_lat = math.cos(math.radians((lat1 + lat2) / 2))
+            segment_x = (long2 - long1) * cos_lat * km_per_degree
+            segment_y = (lat2 - lat1) * km_per_degree
+            point_x = (longs[candidates] - long1) * cos_lat * km_per_degree
+            point_y = (lats[candidates] - lat1) * km_per_degree
+
+            # closest point of the segment
+            length = segment_x ** 2 + segment_y ** 2
+            if length == 0:
+                t = 0
+            else:
+                t = np.clip((point_x * segment_x + point_y * segment_y) / length, 0, 1)
+            distance = np.hypot(point_x - t * segment_x, point_y - t * segment_y)
+            mask[candidates[distance <= self.width]] = True
+
+        return mask
+
+    def mask(self, columns):
+        lats = np.asarray(columns['lat'], dtype=np.float64)
+        longs = np.asarray(columns['long'], dtype=np.float64)
+        mask = self._mask(lats, longs)
+
+        # the corridor can go past 180 or -180, the points are tested again moved by 360 degrees
+        for shift in longitude_shifts(self._bbox[1], self._bbox[3])[1:]:
+            remaining = np.flatnonzero(~mask)
+            mask[remaining] = self._mask(lats[remaining], longs[remaining] + shift)
+        return mask
+
+    def may_match(self, zone_map):
+        lat_min, long_min, lat_max, long_max = self._bbox
+        return any(bbox_may_match(zone_map, lat_min, long_min - shift, lat_max, long_max - shift)
+                   for shift in longitude_shifts(long_min, long_max))
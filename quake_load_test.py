@@ -0,0 +1,122 @@
+import argparse
+import http.client
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+import quake_server
+import quake_stats
+
+# mix of queries sent by the load test
+QUERY_TEMPLATES = (
+    "/quakes?lat={lat}&lon={lon}&distance={distance}&limit=20",
+    "/stats?magnitude={magnitude}",
+    "/stats?lat={lat}&lon={lon}&distance={distance}&significance={significance}",
+    "/aggregate?felt={felt}",
+)
+
+
+def random_query(rng):
+    """
+    :param rng: random.Random object
+    :return: path of a random query
+    """
+    return rng.choice(QUERY_TEMPLATES).format(lat=rng.uniform(-90, 90), lon=rng.uniform(-180, 180),
+                                              distance=rng.uniform(100, 5000), magnitude=rng.uniform(0, 6),
+                                              significance=rng.uniform(0, 600), felt=rng.randint(0, 50))
+
+
+def run_client(url, requests, seed, latencies, errors):
+    """
+    This function will send requests over one keep-alive connection and record their latencies
+    :param url: base url of the server
+    :param requests: number of requests to send
+    :param seed: seed for the random queries
+    :param latencies: list where the latencies (seconds) are appended
+    :param errors: list where failed requests are appended
+    """
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+    rng = random.Random(seed)
+
+    for _ in range(requests):
+        path = random_query(rng)
+        start = time.perf_counter()
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append((path, response.status))
+        except (OSError, http.client.HTTPException) as e:
+            errors.append((path, str(e)))
+            connection.close()
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+    connection.close()
+
+
+def load_test(url, clients=8, requests=200):
+    """
+    This function will send requests from several concurrent clients and measure the server
+    :param url: base url of the server
+    :param clients: number of concurrent clients (threads)
+    :param requests: number of requests sent by each client
+    :return: dictionary with requests, errors, p50 and p99 latencies (ms) and throughput (requests per second)
+    """
+    latencies = []
+    errors = []
+    threads = [threading.Thread(target=run_client, args=(url, requests, seed, latencies, errors))
+               for seed in range(clients)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    p50, p99 = quake_stats.exact_quantiles(np.array(latencies) * 1000, [50, 99])
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'p50_ms': p50,
+        'p99_ms': p99,
+        'throughput': len(latencies) / elapsed
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Load test for the earthquake query server")
+    parser.add_argument("--url", help="url of a running server, if missing a local server is started")
+    parser.add_argument("--clients", type=int, default=8, help="number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="number of requests per client")
+    parser.add_argument("sources", nargs="*", help="geojson file or feed urls for the local server")
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if url is None:
+        server = quake_server.QuakeServer(quake_server.load_quake_data(args.sources)).start()
+        url = server.url
+
+    try:
+        results = load_test(url, args.clients, args.requests)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print(f"Requests: {results['requests']} ({results['errors']} errors)")
+    print(f"p50 latency: {results['p50_ms']:.2f} ms")
+    print(f"p99 latency: {results['p99_ms']:.2f} ms")
+    print(f"Throughput: {results['throughput']:.1f} requests/s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
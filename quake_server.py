@@ -0,0 +1,290 @@
+import json
+import sys
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+import earthquakes
+import feed_ingest
+import quake_filters
+import quake_stats
+
+
+def parse_filter(params):
+    """
+    This function will build the filter of a request from its query parameters
+    Location filter needs lat, lon and distance. Property filter needs at least one of magnitude, felt, significance
+    Time filter needs at least one of start, end. Depth filter needs at least one of min_depth, max_depth
+    :param params: dictionary of parameter name -> value
+    :return: QuakeFilter object, None if the request has no filters
+    """
+    filters = []
+
+    location_params = [params.get(name) for name in ("lat", "lon", "distance")]
+    if any(value is not None for value in location_params):
+        if any(value is None for value in location_params):
+            raise ValueError("Location filter needs lat, lon and distance")
+        filters.append(quake_filters.LocationFilter(*location_params))
+
+    property_params = [params.get(name) for name in ("magnitude", "felt", "significance")]
+    if any(value is not None for value in property_params):
+        filters.append(quake_filters.PropertyFilter(*property_params))
+
+    time_params = [params.get(name) for name in ("start", "end")]
+    if any(value is not None for value in time_params):
+        filters.append(quake_filters.TimeFilter(*time_params))
+
+    depth_params = [params.get(name) for name in ("min_depth", "max_depth")]
+    if any(value is not None for value in depth_params):
+        filters.append(quake_filters.DepthFilter(*depth_params))
+
+    if not filters:
+        return None
+    return quake_filters.AndFilter(*filters)
+
+
+def quake_row_to_dictionary(row):
+    """
+    :param row: row of a QuakeData np array
+    :return: json serializable dictionary with the fields of the earthquake
+    """
+    return {
+        'magnitude': float(row['magnitude']),
+        'time': int(row['time']),
+        'felt': int(row['felt']),
+        'significance': int(row['significance']),
+        'lat': float(row['lat']),
+        'long': float(row['long']),
+        'depth': float(row['depth']),
+        'id': row['quake'].id,
+        'source': row['quake'].source
+    }
+
+
+def magnitude_stats(magnitudes):
+    """
+    :param magnitudes: np array of magnitudes
+    :return: dictionary with count, mean, std, median and mode (None when there are no magnitudes)
+    """
+    if len(magnitudes) == 0:
+        return {'count': 0, 'mean': None, 'std': None, 'median': None, 'mode': None}
+
+    return {
+        'count': len(magnitudes),
+        'mean': float(np.mean(magnitudes)),
+        'std': float(np.std(magnitudes)),
+        'median': quake_stats.median(magnitudes),
+        'mode': quake_stats.magnitude_mode(magnitudes)
+    }
+
+
+class QuakeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def send_json(self, status, content):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        # every request reads one snapshot, even if new events are swapped in while it runs
+        snapshot = self.server.quake_server.snapshot
+
+        try:
+            # the health check does not look at the filter parameters
+            if url.path == "/health":
+                self.send_json(200, {'count': len(snapshot.quake_array)})
+
+            elif url.path == "/quakes":
+                filtered_array = snapshot.cached_query(parse_filter(params))
+                limit = int(params.get("limit", len(filtered_array)))
+                self.send_json(200, {'count': len(filtered_array),
+                                     'quakes': [quake_row_to_dictionary(row) for row in filtered_array[:limit]]})
+
+            elif url.path == "/stats":
+                filtered_array = snapshot.cached_query(parse_filter(params))
+                self.send_json(200, magnitude_stats(filtered_array['magnitude']))
+
+            elif url.path == "/aggregate":
+                filtered_array = snapshot.cached_query(parse_filter(params))
+                decimals = int(params.get("decimals", 0))
+                magnitudes, counts = np.unique(np.round(filtered_array['magnitude'], decimals), return_counts=True)
+                self.send_json(200, {'counts': [[float(magnitude), int(count)]
+                                                for magnitude, count in zip(magnitudes, counts)]})
+
+            else:
+                self.send_json(404, {'error': f"Unknown path {url.path}"})
+
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+        except Exception:
+            self.send_internal_error()
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/events":
+            self.send_json(404, {'error': f"Unknown path {self.path}"})
+            return
+
+        try:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            added = self.server.quake_server.add_events(feed_ingest.parse_feed(body))
+            self.send_json(200, {'added': added, 'count': len(self.server.quake_server.snapshot.quake_array)})
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+        except Exception:
+            self.send_internal_error()
+
+    def send_internal_error(self):
+        # answering keeps the keep alive connection usable, an unhandled exception would close it.
+        # The request logs are silenced, the traceback goes to stderr
+        sys.stderr.write(traceback.format_exc())
+        self.send_json(500, {'error': "Internal server error"})
+
+    def log_message(self, format, *args):
+        # a busy server would flood the terminal
+        pass
+
+
+class QuakeServer:
+    def __init__(self, quake_data, host="127.0.0.1", port=0, cache_bytes=earthquakes.DEFAULT_CACHE_BYTES):
+        """
+        Long lived HTTP server answering filter, stats and aggregation queries over a loaded QuakeData
+        Filters come from the query parameters of each request and never touch the QuakeData filter attributes
+        Requests read an immutable snapshot, new events are merged into a new snapshot that replaces it atomically
+        The snapshot holds every earthquake in memory, a ChunkedQuakeData is loaded in full
+
+        GET /quakes?lat=&lon=&distance=&magnitude=&felt=&significance=&start=&end=&min_depth=&max_depth=&limit=
+        GET /stats?<filters>
+        GET /aggregate?<filters>&decimals=
+        GET /health
+        POST /events (geojson body)
+        :param quake_data: QuakeData object
+        :param host: host to listen on
+        :param port: port to listen on, 0 for a free port
+        :param cache_bytes: memory budget of the query results cached by each snapshot, float parameters make most
+            requests distinct so the cache would otherwise grow with the number of requests
+        """
+        self.cache_bytes = cache_bytes
+        self._write_lock = threading.Lock()
+        self.snapshot = self._freeze(quake_data)
+
+        self._server = ThreadingHTTPServer((host, port), QuakeRequestHandler)
+        self._server.daemon_threads = True
+        self._server.quake_server = self
+        self._thread = None
+
+    def _freeze(self, quake_data):
+        # copy without filters and read only, so a snapshot can be shared by every request thread
+        snapshot = earthquakes.QuakeData.from_array(quake_data.quake_array.copy())
+        snapshot.quake_array.flags.writeable = False
+        snapshot.cache_bytes = self.cache_bytes
+        return snapshot
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def swap(self, quake_data):
+        """
+        This function will replace the served earthquakes, requests already running keep their snapshot
+        :param quake_data: QuakeData object
+        """
+        snapshot = self._freeze(quake_data)
+        with self._write_lock:
+            self.snapshot = snapshot
+
+    def add_events(self, quake_data):
+        """
+        This function will merge new earthquakes into a new snapshot and swap it in
+        :param quake_data: QuakeData object with the new earthquakes
+        :return: number of earthquakes added
+        """
+        # writers are serialised so no events are lost, readers are never blocked
+        with self._write_lock:
+            merged = earthquakes.merge_quake_data([self.snapshot, quake_data])
+            merged.quake_array.flags.writeable = False
+            merged.cache_bytes = self.cache_bytes
+            self.snapshot = merged
+        return len(quake_data.quake_array)
+
+    def serve_forever(self):
+        """
+        This function will serve requests in the current thread until shutdown is called
+        """
+        self._server.serve_forever()
+
+    def start(self):
+        """
+        This function will serve requests in a background thread
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        """
+        This function will stop the server
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+
+def load_quake_data(sources):
+    """
+    This function will load a QuakeData object from a geojson file or from feed urls
+    :param sources: list with a path or with feed urls
+    :return: QuakeData object
+    """
+    if sources and feed_ingest.is_url(sources[0]):
+        return feed_ingest.FeedIngestor().ingest(sources)
+
+    path = Path(sources[0] if sources else "./earthquakes.geojson")
+    if not path.exists():
+        print("File doesnt exist")
+        sys.exit()
+
+    try:
+        return earthquakes.QuakeData(json.loads(path.read_text()))
+    except ValueError as e:
+        print(e)
+        sys.exit()
+
+
+def main(argv):
+    # optional --port argument, the rest are the path or the feed urls
+    port = 8000
+    if len(argv) > 1 and argv[0] == "--port":
+        port = int(argv[1])
+        argv = argv[2:]
+
+    quake_data = load_quake_data(argv)
+    server = QuakeServer(quake_data, port=port)
+    print(f"Serving {len(quake_data.quake_array)} earthquakes on {server.url}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
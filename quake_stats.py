@@ -0,0 +1,290 @@
+import math
+
+import numpy as np
+
+
+def exact_quantiles(values, percentiles, overwrite_input=False):
+    """
+    This function will calculate exact percentiles using selection (np.partition) instead of a full sort
+    The interpolation between the two closest ranks is linear, the same as np.percentile
+    :param values: a sequence or np array of numbers
+    :param percentiles: a percentile or a sequence of percentiles between 0 and 100
+    :param overwrite_input: if True and values is a float np array that owns its data, it will be partitioned in
+        place (no copy). Views, such as a column of a QuakeData np array, are always copied
+    :return: a float if a single percentile was requested (nan if any value is nan), otherwise a np array of floats
+    """
+    scalar = np.ndim(percentiles) == 0
+    percentiles = np.atleast_1d(np.asarray(percentiles, dtype=np.float64))
+
+    if np.any((percentiles < 0) | (percentiles > 100)):
+        raise ValueError("Percentiles must be between 0 and 100")
+
+    # only partition in place when we were given a float array we are allowed to reorder
+    # a view (for example quake_array['magnitude']) would reorder the values against the rest of its rows
+    if (overwrite_input and isinstance(values, np.ndarray) and values.dtype == np.float64 and values.ndim == 1
+            and values.flags.owndata and values.flags.writeable):
+        data = values
+    else:
+        data = np.array(values, dtype=np.float64).ravel()
+
+    # no values, no percentiles. nan values have no rank, like np.percentile the result is nan
+    if len(data) == 0 or np.isnan(data).any():
+        result = np.full(len(percentiles), np.nan)
+        return float(result[0]) if scalar else result
+
+    # fractional rank of each percentile
+    positions = percentiles / 100 * (len(data) - 1)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.ceil(positions).astype(np.intp)
+
+    # place only the required ranks in their sorted positions
+    data.partition(np.unique(np.concatenate((lower, upper))))
+
+    # interpolate between the lower and upper ranks
+    fraction = positions - lower
+    result = data[lower] + (data[upper] - data[lower]) * fraction
+
+    return float(result[0]) if scalar else result
+
+
+def median(values, overwrite_input=False):
+    """
+    This function will calculate the exact median using selection
+    :param values: a sequence or np array of numbers
+    :param overwrite_input: if True the np array can be partitioned in place
+    :return: the median as a float
+    """
+    return exact_quantiles(values, 50, overwrite_input)
+
+
+def magnitude_mode(values, decimals=0):
+    """
+    This function will calculate the mode of the values after rounding them
+    Unlike np.bincount this works with negative values (valid for USGS magnitudes)
+    :param values: a sequence or np array of numbers
+    :param decimals: number of decimals used when rounding the values
+    :return: the most common rounded value, nan if there are no values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return math.nan
+
+    # count each distinct rounded value and pick the most common one (smallest on ties)
+    rounded_values, counts = np.unique(np.round(values, decimals), return_counts=True)
+    return float(rounded_values[np.argmax(counts)])
+
+
+class ModeCounter:
+    def __init__(self, decimals=0):
+        """
+        Mergeable counter of rounded values, used to get the mode of data that arrives in chunks
+        :param decimals: number of decimals used when rounding the values
+        """
+        self.decimals = decimals
+        self.counts = {}
+
+    def update(self, values):
+        """
+        This function will add a chunk of values to the counter
+        :param values: a sequence or np array of numbers
+        """
+        values = np.asarray(values, dtype=np.float64)
+        rounded_values, counts = np.unique(np.round(values, self.decimals), return_counts=True)
+        for value, count in zip(rounded_values.tolist(), counts.tolist()):
+            self.counts[value] = self.counts.get(value, 0) + count
+
+    def merge(self, other):
+        """
+        This function will add the counts of another counter to this one
+        :param other: ModeCounter with the same number of decimals
+        :return: this counter
+        """
+        if other.decimals != self.decimals:
+            raise ValueError("Cannot merge counters with different rounding")
+        for value, count in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+        return self
+
+    def mode(self):
+        """
+        :return: the most common rounded value (smallest on ties), nan if empty
+        """
+        if not self.counts:
+            return math.nan
+        return min(self.counts, key=lambda value: (-self.counts[value], value))
+
+
+class QuantileSketch:
+    def __init__(self, k=200, seed=None):
+        """
+        Mergeable approximate quantile sketch (KLL style)
+        Values are kept in levels of compactors, an item in level h stands for 2^h values
+        When a level is over its capacity it is sorted and every other item is promoted to the next level
+        The memory used is O(k log(n/k)) and the rank error is roughly 1/k of the number of values
+        :param k: size of the largest compactor, larger values are more accurate
+        :param seed: seed for the random offsets used when compacting
+        """
+        if k < 8:
+            raise ValueError("k must be at least 8")
+        self.k = k
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        # top level holds k items, each level below holds 2/3 of the one above
+        depth = len(self._levels) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        level = 0
+        while level < len(self._levels):
+            items = self._levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+
+                items = np.sort(items)
+
+                # an odd item stays behind so the total weight is preserved
+                leftover = items[len(items) - len(items) % 2:]
+                items = items[:len(items) - len(items) % 2]
+
+                # promote every other item, starting at a random offset
+                offset = self._rng.integers(2)
+                self._levels[level + 1] = np.concatenate((self._levels[level + 1], items[offset::2]))
+                self._levels[level] = leftover
+
+                # capacities change when a level is added so start again from the bottom
+                level = 0
+                continue
+            level += 1
+
+    def update(self, values):
+        """
+        This function will add a chunk of values to the sketch, nan values are ignored
+        :param values: a sequence or np array of numbers
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        self._levels[0] = np.concatenate((self._levels[0], values))
+        self._compress()
+
+    def merge(self, other):
+        """
+        This function will merge another sketch into this one
+        :param other: QuantileSketch with the same k
+        :return: this sketch
+        """
+        if other.k != self.k:
+            raise ValueError("Cannot merge sketches with different k")
+
+        while len(self._levels) < len(other._levels):
+            self._levels.append(np.empty(0))
+        for level, items in enumerate(other._levels):
+            self._levels[level] = np.concatenate((self._levels[level], items))
+
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantiles(self, percentiles):
+        """
+        This function will estimate percentiles of all the values added to the sketch
+        :param percentiles: a percentile or a sequence of percentiles between 0 and 100
+        :return: a float if a single percentile was requested, otherwise a np array of floats
+        """
+        scalar = np.ndim(percentiles) == 0
+        percentiles = np.atleast_1d(np.asarray(percentiles, dtype=np.float64))
+
+        if np.any((percentiles < 0) | (percentiles > 100)):
+            raise ValueError("Percentiles must be between 0 and 100")
+
+        if self.count == 0:
+            result = np.full(len(percentiles), np.nan)
+            return float(result[0]) if scalar else result
+
+        # weighted items, sorted
+        items = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(level_items), 2 ** level, dtype=np.int64)
+                                  for level, level_items in enumerate(self._levels)])
+        order = np.argsort(items, kind="stable")
+        items = items[order]
+        cumulative_weights = np.cumsum(weights[order])
+
+        # first item whose cumulative weight reaches the requested rank
+        ranks = percentiles / 100 * self.count
+        index = np.minimum(np.searchsorted(cumulative_weights, ranks, side="left"), len(items) - 1)
+        result = items[index]
+
+        # the extremes are known exactly
+        result = np.where(percentiles == 0, self.min, result)
+        result = np.where(percentiles == 100, self.max, result)
+
+        return float(result[0]) if scalar else result
+
+    def median(self):
+        """
+        :return: estimated median of the values in the sketch
+        """
+        return self.quantiles(50)
+
+
+class MomentsAccumulator:
+    def __init__(self):
+        """
+        Mergeable count, mean and standard deviation (parallel variance algorithm by Chan et al.)
+        """
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, values):
+        """
+        This function will add a chunk of values to the accumulator
+        :param values: a sequence or np array of numbers
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+
+        other = MomentsAccumulator()
+        other.count = len(values)
+        other.mean = float(np.mean(values))
+        other._m2 = float(np.sum((values - other.mean) ** 2))
+        self.merge(other)
+
+    def merge(self, other):
+        """
+        This function will combine the moments of another accumulator with this one
+        :param other: MomentsAccumulator
+        :return: this accumulator
+        """
+        if other.count == 0:
+            return self
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta ** 2 * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        return self
+
+    def std(self):
+        """
+        :return: population standard deviation (same as np.std), nan if empty
+        """
+        if self.count == 0:
+            return math.nan
+        return math.sqrt(self._m2 / self.count)
@@ -0,0 +1,172 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+import chunked_quakes
+import earthquakes
+import quake_anomaly
+import quake_association
+import quake_columnar
+import quake_filters
+import quake_server
+
+
+def create_random_earthquakes_dictionary(n, seed):
+    """This function will simulate a geojson report with n random earthquakes
+    All the earthquakes match the format accepted by QuakeData
+    """
+    rng = np.random.default_rng(seed)
+    features = []
+    for i in range(n):
+        features.append({
+            "type": "Feature",
+            "properties": {
+                "mag": round(float(rng.uniform(-1, 7)), 2),
+                "time": 1715221312431 + i * 60_000,
+                "felt": int(rng.integers(0, 100)),
+                "sig": int(rng.integers(0, 1000)),
+                "magType": "ml",
+                "type": "earthquake",
+            },
+            "geometry": {
+                "type": "Point",
+                "coordinates": [
+                    float(rng.uniform(-90, 90)),
+                    float(rng.uniform(-180, 180)),
+                    float(rng.uniform(0, 50))
+                ]
+            },
+            "id": f"test{seed}_{i}"
+        })
+    return {"features": features}
+
+
+class TestChunkedQuakeData(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dictionaries = [create_random_earthquakes_dictionary(250, seed) for seed in range(4)]
+        self.chunked = chunked_quakes.ChunkedQuakeData.create(self.temp_dir.name, self.dictionaries, chunk_size=128)
+
+        # the same catalogue in memory
+        self.quake_data = earthquakes.QuakeData(
+            {"features": [feature for dictionary in self.dictionaries for feature in dictionary["features"]]})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    # every earthquake should be written once, in chunks no larger than the chunk size
+    def test_create_chunks(self):
+        self.assertEqual(len(self.chunked), 1000)
+        self.assertEqual(len(self.chunked.chunks), 8)
+        self.assertTrue(all(chunk['rows'] <= 128 for chunk in self.chunked.chunks))
+
+        # reopening the directory gives the same catalogue
+        reopened = chunked_quakes.ChunkedQuakeData(self.temp_dir.name)
+        self.assertEqual(len(reopened), 1000)
+
+    # chunked filtering should match the in memory QuakeData
+    def test_filters_match_quake_data(self):
+        for quake_data in (self.chunked, self.quake_data):
+            quake_data.set_location_filter(10, 20, 4000)
+            quake_data.set_property_filter(magnitude=2, significance=300)
+
+        chunked_array = self.chunked.get_filtered_array()
+        in_memory_array = self.quake_data.get_filtered_array()
+
+        self.assertGreater(len(in_memory_array), 0)
+        self.assertEqual(self.chunked.count(), len(in_memory_array))
+        np.testing.assert_array_equal(np.sort(chunked_array['time']), np.sort(in_memory_array['time']))
+        self.assertEqual(str(chunked_array['quake'][0]), str(in_memory_array['quake'][0]))
+
+    # a chunked catalogue can be used where a QuakeData object is expected
+    def test_used_as_quake_data(self):
+        self.assertEqual(len(self.chunked.quake_array), 1000)
+
+        path = Path(self.temp_dir.name) / "quakes.numpy"
+        quake_columnar.export_quake_data(self.chunked, path, "numpy")
+        np.testing.assert_array_equal(np.sort(quake_columnar.import_quake_data(path).quake_array['time']),
+                                      np.sort(self.quake_data.quake_array['time']))
+
+        deduplicated = quake_association.deduplicate(self.chunked, time_tolerance=0, distance_tolerance=0.001)
+        self.assertIsInstance(deduplicated, earthquakes.QuakeData)
+        self.assertEqual(len(deduplicated.quake_array), 1000)
+
+        with quake_server.QuakeServer(self.chunked) as server:
+            self.assertEqual(len(server.snapshot.quake_array), 1000)
+
+    # only the functions documented as loading every earthquake use quake_array
+    def test_functions_without_full_load(self):
+        class ChunksOnly(chunked_quakes.ChunkedQuakeData):
+            @property
+            def quake_array(self):
+                raise AssertionError("the whole catalogue was loaded")
+
+        chunked = ChunksOnly(self.temp_dir.name)
+        self.quake_data.set_property_filter(magnitude=2)
+        chunked.set_property_filter(magnitude=2)
+        expected = self.quake_data.get_filtered_array()
+
+        self.assertEqual(chunked.count(), len(expected))
+        self.assertEqual(chunked.magnitude_stats()['count'], len(expected))
+        self.assertEqual(sum(chunked.magnitude_counts().values()), len(expected))
+        self.assertEqual(len(chunked.get_filtered_array()), len(expected))
+        self.assertEqual(len(chunked.get_filtered_list()), len(expected))
+        self.assertEqual(len(chunked.cached_query(quake_filters.PropertyFilter(magnitude=2))), len(expected))
+        np.testing.assert_array_equal(quake_anomaly.detect_rate_anomalies(chunked, cell_size=1, bin_seconds=3600),
+                                      quake_anomaly.detect_rate_anomalies(self.quake_data, cell_size=1,
+                                                                          bin_seconds=3600))
+
+        path = Path(self.temp_dir.name) / "quakes.numpy"
+        quake_columnar.export_quake_data(chunked, path, "numpy")
+        self.assertEqual(len(quake_columnar.import_columns(path)['time']), 1000)
+        self.assertEqual(len(quake_association.deduplicate(chunked, distance_tolerance=0.001).quake_array), 1000)
+
+    # statistics are computed chunk by chunk
+    def test_magnitude_stats(self):
+        self.chunked.set_property_filter(magnitude=1)
+        self.quake_data.set_property_filter(magnitude=1)
+        magnitudes = self.quake_data.get_filtered_array()['magnitude']
+
+        stats = self.chunked.magnitude_stats()
+        self.assertEqual(stats['count'], len(magnitudes))
+        self.assertAlmostEqual(stats['mean'], np.mean(magnitudes))
+        self.assertAlmostEqual(stats['std'], np.std(magnitudes))
+        self.assertAlmostEqual(stats['median'], np.median(magnitudes), delta=0.2)
+        self.assertEqual(sum(self.chunked.magnitude_counts().values()), len(magnitudes))
+
+    # chunks ruled out by their zone maps are not read
+    def test_zone_maps_skip_chunks(self):
+        self.chunked.set_property_filter(magnitude=100)
+        self.chunked.load_chunk = None
+        self.assertEqual(self.chunked.count(), 0)
+        self.assertEqual(len(self.chunked.get_filtered_array()), 0)
+
+        chunk = self.chunked.chunks[0]
+        self.chunked.clear_filter()
+        self.chunked.set_location_filter(chunk['zone_map']['lat'][1] + 10, 0, 1000)
+        self.assertFalse(self.chunked.current_filter().may_match(chunk['zone_map']))
+
+    # filter objects can be used directly, time zone maps skip chunks outside of the time range
+    # a NaN value should not hide the other earthquakes of its chunk
+    def test_zone_maps_with_nan(self):
+        dictionary = create_random_earthquakes_dictionary(100, 5)
+        dictionary['features'][3]['properties']['mag'] = float("nan")
+        chunked = chunked_quakes.ChunkedQuakeData.create(Path(self.temp_dir.name) / "nan", [dictionary])
+        quake_data = earthquakes.QuakeData(dictionary)
+
+        self.assertTrue(np.isnan(quake_data.quake_array['magnitude']).any())
+        self.assertFalse(np.isnan(chunked.chunks[0]['zone_map']['magnitude']).any())
+        expected = quake_data.query(quake_filters.PropertyFilter(magnitude=1))
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(len(chunked.query(quake_filters.PropertyFilter(magnitude=1))), len(expected))
+
+    def test_query_with_time_filter(self):
+        first_time = self.chunked.chunks[0]['zone_map']['time'][0]
+        time_filter = quake_filters.TimeFilter(end=first_time + 60_000)
+        self.assertEqual(len(self.chunked.query(time_filter)), len(self.quake_data.query(time_filter)))
+
+        skipped = [chunk for chunk in self.chunked.chunks if not time_filter.may_match(chunk['zone_map'])]
+        self.assertGreater(len(skipped), 0)
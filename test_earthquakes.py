@@ -3,6 +3,7 @@ from unittest import TestCase
 import numpy as np
 
 import earthquakes
+import quake_filters
 from pathlib import Path
 import json
 
@@ -88,6 +89,47 @@ class TestCalculateDistance(TestCase):
             earthquakes.calc_distance(0, 0, 0, 'lon2')
 
 
+class TestCoerceNumericArray(TestCase):
+
+    # numeric values and numeric strings are converted in one go
+    def test_all_values_valid(self):
+        values, valid, reasons = earthquakes.coerce_numeric_array([1, "2.5", 3.0, True])
+        np.testing.assert_array_equal(values, [1, 2.5, 3, 1])
+        self.assertTrue(valid.all())
+        self.assertEqual(reasons, {})
+
+    # invalid values are reported with the same message as ensure_numeric
+    def test_invalid_values_have_reasons(self):
+        values, valid, reasons = earthquakes.coerce_numeric_array(["abc", 4, None, "5"])
+        np.testing.assert_array_equal(valid, [False, True, False, True])
+        np.testing.assert_array_equal(values, [0, 4, 0, 5])
+        self.assertEqual(reasons[0], "abc is not a numeric value")
+        self.assertIn(2, reasons)
+
+        with self.assertRaises(ValueError) as context:
+            earthquakes.ensure_numeric("abc")
+        self.assertEqual(str(context.exception), reasons[0])
+
+    # integer columns reject values that are not finite
+    def test_integer_dtype(self):
+        values, valid, reasons = earthquakes.coerce_numeric_array(np.array([1.9, np.nan, -2.5]), np.int64)
+        np.testing.assert_array_equal(values, [1, 0, -2])
+        np.testing.assert_array_equal(valid, [True, False, True])
+        self.assertEqual(list(reasons), [1])
+
+    # earthquakes with a field that cannot be converted are skipped, the other lists stay aligned
+    def test_invalid_fields_are_skipped(self):
+        earthquakes_dictionary = create_only_10_earthquakes_dictionary()
+        earthquakes_dictionary['features'][3]['properties']['mag'] = "strong"
+        earthquakes_dictionary['features'][5]['properties']['sig'] = None
+        earthquakes_dictionary['features'][7]['properties']['mag'] = "4.5"
+
+        quake_data = earthquakes.QuakeData(earthquakes_dictionary)
+        self.assertEqual(len(quake_data.quake_array), 8)
+        self.assertEqual(sorted(quake_data.quake_array['magnitude']), [2.9] * 7 + [4.5])
+        self.assertEqual(quake_data.quake_array['quake'][5].mag, 4.5)
+
+
 class TestQuake(TestCase):
 
     # This test will ensure the proper creation of the quake object with valid input
@@ -127,6 +169,11 @@ class TestQuakeData(TestCase):
         self.assertIsInstance(quake_data, earthquakes.QuakeData)
         self.assertEqual(len(quake_data.quake_array.tolist()), 10)
 
+    # dictionaries without the geojson structure raise a ValueError instead of exiting
+    def test_create_quake_data_from_invalid_dictionary(self):
+        with self.assertRaises(ValueError):
+            earthquakes.QuakeData({"features": ["not a feature"]})
+
     def test_create_quake_data_from_dictionary_will_ignore_an_invalid_entry(self):
         earthquakes_dictionary = create_only_10_earthquakes_dictionary()
 
@@ -263,4 +310,47 @@ class TestQuakeData(TestCase):
         self.assertEqual(len(strong_filter_array), 1)
         self.assertEqual(len(strong_filter_list), 1)
 
+    # query should give the same result as the object filters without changing them
+    def test_query_does_not_use_object_filters(self):
+        earthquakes_dictionary = create_only_10_earthquakes_dictionary()
+        quake_data = earthquakes.QuakeData(earthquakes_dictionary)
 
+        quake_data.set_property_filter(5, 30, 300)
+        self.assertEqual(len(quake_data.query()), 10)
+        self.assertEqual(len(quake_data.query(quake_filters.PropertyFilter(5, 30, 300))),
+                         len(quake_data.get_filtered_array()))
+        self.assertEqual(len(quake_data.query(quake_filters.LocationFilter(100, 100, 1))), 10)
+        self.assertEqual(quake_data.property_filter, (5, 30, 300))
+
+    # cached results are shared and read only, queries can run in a thread pool
+    def test_cached_query_and_query_many(self):
+        quake_data = earthquakes.QuakeData(create_only_10_earthquakes_dictionary())
+
+        quake_filter = quake_filters.PropertyFilter(magnitude=2)
+        first = quake_data.cached_query(quake_filter)
+        self.assertIs(quake_data.cached_query(quake_filters.PropertyFilter(magnitude=2)), first)
+        self.assertFalse(first.flags.writeable)
+
+        results = quake_data.query_many([quake_filter, quake_filters.PropertyFilter(magnitude=3)], max_workers=2)
+        self.assertEqual([len(result) for result in results], [10, 0])
+
+    # the cached results are bounded by their total size, the least recently used are forgotten first
+    def test_cached_query_memory(self):
+        quake_data = earthquakes.QuakeData(create_only_10_earthquakes_dictionary())
+        row_bytes = quake_data.quake_array.itemsize
+        quake_data.cache_bytes = 25 * row_bytes
+
+        quake_filter_list = [quake_filters.PropertyFilter(magnitude=magnitude / 10) for magnitude in range(20)]
+        for quake_filter in quake_filter_list:
+            self.assertEqual(len(quake_data.cached_query(quake_filter)), 10)
+        self.assertLessEqual(quake_data._cache_nbytes, quake_data.cache_bytes)
+        self.assertEqual(list(quake_data._cache), quake_filter_list[-2:])
+
+        # without a filter the result is the np array of the object
+        self.assertIs(quake_data.cached_query().base, quake_data.quake_array)
+        self.assertEqual(len(quake_data._cache), 3)
+
+        # a result larger than the budget is not kept
+        quake_data.cache_bytes = 5 * row_bytes
+        self.assertEqual(len(quake_data.cached_query(quake_filters.PropertyFilter(magnitude=-1))), 10)
+        self.assertNotIn(quake_filters.PropertyFilter(magnitude=-1), quake_data._cache)
@@ -0,0 +1,76 @@
+import asyncio
+import time
+from unittest import TestCase
+
+import feed_ingest
+from mock_feed_server import MockFeedServer
+from test_chunked_quakes import create_random_earthquakes_dictionary
+
+
+class TestFeedIngestor(TestCase):
+
+    def setUp(self):
+        self.server = MockFeedServer(delay=0.2).start()
+        self.paths = [f"/summary/{level}_day.geojson" for level in ("significant", "4.5", "2.5", "1.0", "all")]
+        for seed, path in enumerate(self.paths):
+            self.server.set_feed(path, create_random_earthquakes_dictionary(20 + seed, seed))
+        self.urls = [self.server.url(path) for path in self.paths]
+
+    def tearDown(self):
+        self.server.stop()
+
+    # all the feeds should be downloaded at the same time and merged into one QuakeData
+    def test_ingest_merges_feeds_concurrently(self):
+        ingestor = feed_ingest.FeedIngestor(max_connections=8)
+
+        start = time.perf_counter()
+        quake_data = ingestor.ingest(self.urls)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(quake_data.quake_array), sum(20 + seed for seed in range(5)))
+        self.assertEqual(ingestor.errors, {})
+        self.assertLess(elapsed, 0.2 * len(self.urls))
+
+    # a second ingest should use conditional GET and reuse the parsed feeds
+    def test_conditional_get(self):
+        ingestor = feed_ingest.FeedIngestor()
+        first = ingestor.ingest(self.urls)
+        second = ingestor.ingest(self.urls)
+
+        self.assertEqual(self.server.not_modified_count, len(self.urls))
+        self.assertEqual(set(ingestor.statuses.values()), {304})
+        self.assertEqual(len(first.quake_array), len(second.quake_array))
+
+        # a changed feed is downloaded again
+        self.server.set_feed(self.paths[0], create_random_earthquakes_dictionary(3, 99))
+        third = ingestor.ingest(self.urls)
+        self.assertEqual(ingestor.statuses[self.urls[0]], 200)
+        self.assertEqual(len(third.quake_array), len(first.quake_array) - 20 + 3)
+
+    # a missing or invalid feed should not stop the others
+    def test_failed_feed_is_skipped(self):
+        self.server.feeds["/broken.geojson"] = (b"not json", '"x"', "")
+        urls = self.urls[:2] + [self.server.url("/missing.geojson"), self.server.url("/broken.geojson")]
+
+        ingestor = feed_ingest.FeedIngestor()
+        quake_data = ingestor.ingest(urls)
+
+        self.assertEqual(len(quake_data.quake_array), 20 + 21)
+        self.assertEqual(set(ingestor.errors), set(urls[2:]))
+
+    # requests to the same server should reuse the pooled connection
+    def test_connection_pool_reuses_connections(self):
+        async def fetch_all():
+            pool = feed_ingest.ConnectionPool(max_connections=1)
+            responses = [await pool.get(url) for url in self.urls]
+            await pool.close()
+            return pool, responses
+
+        pool, responses = asyncio.run(fetch_all())
+        self.assertEqual([response.status for response in responses], [200] * len(self.urls))
+        self.assertEqual(pool.connections_opened, 1)
+
+    def test_usgs_feed_urls(self):
+        urls = feed_ingest.usgs_feed_urls()
+        self.assertEqual(len(urls), 20)
+        self.assertIn("https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/4.5_week.geojson", urls)
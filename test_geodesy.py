@@ -0,0 +1,89 @@
+from unittest import TestCase
+
+import numpy as np
+
+import earthquakes
+import geodesy
+
+
+def create_random_points(n, seed):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-90, 90, n), rng.uniform(-180, 180, n)
+
+
+class TestDistanceMatrix(TestCase):
+
+    # every distance should match the scalar haversine
+    def test_matches_calc_distance(self):
+        station_lats, station_longs = create_random_points(7, 1)
+        event_lats, event_longs = create_random_points(50, 2)
+
+        matrix = geodesy.distance_matrix(station_lats, station_longs, event_lats, event_longs)
+        self.assertEqual(matrix.shape, (7, 50))
+        for station in range(7):
+            for event in range(50):
+                self.assertAlmostEqual(matrix[station, event],
+                                       earthquakes.calc_distance(station_lats[station], station_longs[station],
+                                                                 event_lats[event], event_longs[event]), places=6)
+
+    # small memory budgets should give the same matrix in more blocks
+    def test_blocks(self):
+        station_lats, station_longs = create_random_points(10, 3)
+        event_lats, event_longs = create_random_points(1000, 4)
+
+        blocks = list(geodesy.iter_distance_matrix(station_lats, station_longs, event_lats, event_longs,
+                                                   max_bytes=10 * 8 * 2 * 64))
+        self.assertEqual(len(blocks), 16)
+        self.assertTrue(all(block.shape == (10, end - start) for start, end, block in blocks))
+        self.assertEqual(blocks[-1][1], 1000)
+
+        np.testing.assert_allclose(np.concatenate([block for _, _, block in blocks], axis=1),
+                                   geodesy.distance_matrix(station_lats, station_longs, event_lats, event_longs),
+                                   rtol=0, atol=1e-9)
+
+    # float32 matrices use half the memory and stay within a few meters
+    def test_float32(self):
+        station_lats, station_longs = create_random_points(20, 5)
+        event_lats, event_longs = create_random_points(200, 6)
+        event_lats[:20] = station_lats + 0.001
+
+        matrix = geodesy.distance_matrix(station_lats, station_longs, event_lats, event_longs, dtype=np.float32)
+        expected = earthquakes.calc_distance_array(station_lats[:, None], station_longs[:, None],
+                                                   event_lats, event_longs)
+        self.assertEqual(matrix.dtype, np.float32)
+        np.testing.assert_allclose(matrix, expected, rtol=1e-5, atol=0.01)
+
+    def test_empty(self):
+        self.assertEqual(geodesy.distance_matrix([], [], [1.0], [2.0]).shape, (0, 1))
+        self.assertEqual(geodesy.distance_matrix([1.0], [2.0], [], []).shape, (1, 0))
+
+
+class TestBearingAndDestination(TestCase):
+
+    def test_cardinal_bearings(self):
+        bearings = geodesy.initial_bearing(0, 0, [1, 0, -1, 0], [0, 1, 0, -1])
+        np.testing.assert_allclose(bearings, [0, 90, 180, 270], atol=1e-9)
+
+    # the destination point should be at the given distance and bearing from the start
+    def test_destination_round_trip(self):
+        lats, longs = create_random_points(500, 7)
+        lats = np.clip(lats, -85, 85)
+        rng = np.random.default_rng(8)
+        bearings = rng.uniform(0, 360, 500)
+        distances = rng.uniform(1, 5000, 500)
+
+        destination_lats, destination_longs = geodesy.destination_point(lats, longs, bearings, distances)
+        self.assertTrue(np.all((destination_longs >= -180) & (destination_longs < 180)))
+
+        for i in range(0, 500, 25):
+            self.assertAlmostEqual(earthquakes.calc_distance(lats[i], longs[i], destination_lats[i],
+                                                             destination_longs[i]), distances[i], places=6)
+        np.testing.assert_allclose(
+            (geodesy.initial_bearing(lats, longs, destination_lats, destination_longs) - bearings + 180) % 360 - 180,
+            0, atol=1e-6)
+
+    # crossing the antimeridian wraps the longitude
+    def test_destination_wraps(self):
+        lat, lon = geodesy.destination_point(0, 179.5, 90, 111.19492664455873)
+        self.assertAlmostEqual(float(lat), 0, places=9)
+        self.assertAlmostEqual(float(lon), -179.5, places=9)
@@ -0,0 +1,147 @@
+import math
+from unittest import TestCase
+
+import numpy as np
+
+import earthquakes
+import quake_anomaly
+from test_chunked_quakes import create_random_earthquakes_dictionary
+
+DAY_MS = 86_400_000
+
+
+def create_background_columns(days, seed):
+    # one earthquake a day in 50 cells spread around the world, plus random noise
+    rng = np.random.default_rng(seed)
+    cell_lats = rng.uniform(-60, 60, 50)
+    cell_longs = rng.uniform(-170, 170, 50)
+    cells = rng.integers(0, 50, days * 50)
+    return {
+        'lat': cell_lats[cells] + rng.uniform(0, 0.01, len(cells)),
+        'long': cell_longs[cells] + rng.uniform(0, 0.01, len(cells)),
+        'time': np.sort(rng.integers(0, days * DAY_MS, len(cells)))
+    }
+
+
+class TestPoissonUpperTail(TestCase):
+
+    # the tail should match the exact sum of the Poisson probabilities
+    def test_matches_exact_sum(self):
+        for count, rate in [(3, 0.5), (10, 2.0), (1, 0.01), (40, 5.0)]:
+            expected = 1 - sum(math.exp(-rate) * rate ** i / math.factorial(i) for i in range(count))
+            self.assertAlmostEqual(quake_anomaly.poisson_upper_tail([count], [rate])[0], expected, places=12)
+
+    # very unlikely counts should not underflow to 1 - 1
+    def test_small_probabilities(self):
+        p_value = quake_anomaly.poisson_upper_tail([60], [0.01])[0]
+        self.assertGreater(p_value, 0)
+        self.assertLess(p_value, 1e-100)
+
+
+class TestRateAnomalyDetector(TestCase):
+
+    # the cell keys should round trip to the cell corners, including negative coordinates
+    def test_cell_corners(self):
+        detector = quake_anomaly.RateAnomalyDetector(cell_size=0.1)
+        lats, longs = detector.cell_corners(detector.cell_keys([-33.45, 0.05, 89.99], [-70.66, -179.99, 179.99]))
+        np.testing.assert_allclose(lats, [-33.5, 0.0, 89.9])
+        np.testing.assert_allclose(longs, [-70.7, -180.0, 179.9])
+
+    # a steady background rate should not be flagged
+    def test_background_is_not_anomalous(self):
+        detector = quake_anomaly.RateAnomalyDetector(cell_size=0.1)
+        anomalies = np.concatenate((detector.update(create_background_columns(60, 1)), detector.flush()))
+        self.assertEqual(len(anomalies), 0)
+
+    # a swarm in a quiet cell should be flagged in the day it happens
+    def test_swarm_is_flagged(self):
+        columns = create_background_columns(60, 2)
+        swarm = {'lat': np.full(12, 10.03), 'long': np.full(12, -20.07),
+                 'time': np.full(12, 45 * DAY_MS + 3600_000)}
+        columns = {column: np.concatenate((columns[column], swarm[column])) for column in columns}
+
+        detector = quake_anomaly.RateAnomalyDetector(cell_size=0.1)
+        anomalies = np.concatenate((detector.update(columns), detector.flush()))
+        self.assertEqual(len(anomalies), 1)
+        self.assertEqual(anomalies['time'][0], 45 * DAY_MS)
+        self.assertAlmostEqual(anomalies['lat'][0], 10.0)
+        self.assertAlmostEqual(anomalies['long'][0], -20.1)
+        self.assertEqual(anomalies['count'][0], 12)
+        self.assertLess(anomalies['p_value'][0], 1e-4)
+
+    # a bin is only tested when it is closed
+    def test_open_bin_is_not_tested(self):
+        detector = quake_anomaly.RateAnomalyDetector(cell_size=1, warmup_bins=0)
+        columns = {'lat': np.full(20, 0.5), 'long': np.full(20, 0.5), 'time': np.full(20, DAY_MS)}
+        self.assertEqual(len(detector.update(columns)), 0)
+        self.assertEqual(len(detector.flush()), 0)
+
+        # the first bin has no baseline, the second one is compared against the first
+        self.assertEqual(len(detector.update({'lat': [3.5] * 5, 'long': [3.5] * 5, 'time': [2 * DAY_MS] * 5})), 0)
+        self.assertEqual(len(detector.flush()), 1)
+
+    # feeding the earthquakes in several updates should give the same result as one update
+    def test_incremental_updates(self):
+        columns = create_background_columns(40, 3)
+        swarm_times = np.full(8, 30 * DAY_MS + 1)
+        columns['lat'] = np.concatenate((columns['lat'], np.full(8, 5.01)))
+        columns['long'] = np.concatenate((columns['long'], np.full(8, 5.01)))
+        columns['time'] = np.concatenate((columns['time'], swarm_times))
+        order = np.argsort(columns['time'], kind='stable')
+        columns = {column: values[order] for column, values in columns.items()}
+
+        detector = quake_anomaly.RateAnomalyDetector()
+        single = np.concatenate((detector.update(columns), detector.flush()))
+
+        detector = quake_anomaly.RateAnomalyDetector()
+        parts = [detector.update({column: values[start:start + 97] for column, values in columns.items()})
+                 for start in range(0, len(columns['time']), 97)]
+        parts.append(detector.flush())
+        np.testing.assert_array_equal(np.concatenate(parts), single)
+
+    # the baseline of a cell should be its number of earthquakes per bin
+    def test_baseline_rate(self):
+        detector = quake_anomaly.RateAnomalyDetector(cell_size=1, min_rate=0.001)
+        times = np.arange(10) * DAY_MS
+        detector.update({'lat': np.full(10, 0.5), 'long': np.full(10, 0.5), 'time': times})
+        detector.flush()
+        self.assertAlmostEqual(detector.baseline(detector.cell_keys([0.5], [0.5]))[0], 1.0)
+        self.assertAlmostEqual(detector.baseline(detector.cell_keys([5.5], [0.5]))[0], 0.001)
+
+    # with a half life the baseline should follow recent rates
+    def test_decayed_baseline(self):
+        detector = quake_anomaly.RateAnomalyDetector(cell_size=1, half_life_bins=5)
+        times = np.repeat(np.arange(50), 2) * DAY_MS
+        detector.update({'lat': np.full(100, 0.5), 'long': np.full(100, 0.5), 'time': times})
+        detector.flush()
+        self.assertAlmostEqual(detector.baseline(detector.cell_keys([0.5], [0.5]))[0], 2.0)
+
+        # 20 quiet bins later the rate is much lower
+        detector.update({'lat': [20.5], 'long': [0.5], 'time': [70 * DAY_MS]})
+        detector.flush()
+        self.assertLess(detector.baseline(detector.cell_keys([0.5], [0.5]))[0], 0.2)
+
+    # with a short half life the decayed exposure stays below the warmup, swarms must still be found
+    def test_swarm_with_short_half_life(self):
+        columns = create_background_columns(60, 2)
+        swarm = {'lat': np.full(30, 10.03), 'long': np.full(30, -20.07),
+                 'time': np.full(30, 45 * DAY_MS + 3600_000)}
+        columns = {column: np.concatenate((columns[column], swarm[column])) for column in columns}
+
+        for half_life_bins in (3, 1):
+            detector = quake_anomaly.RateAnomalyDetector(cell_size=0.1, half_life_bins=half_life_bins)
+            anomalies = np.concatenate((detector.update(columns), detector.flush()))
+            self.assertLess(detector.exposure, detector.warmup_bins)
+            self.assertIn(30, anomalies['count'].tolist())
+
+    # no earthquakes should give no anomalies
+    def test_empty_update(self):
+        detector = quake_anomaly.RateAnomalyDetector()
+        anomalies = detector.update({'lat': np.empty(0), 'long': np.empty(0), 'time': np.empty(0, dtype=np.int64)})
+        self.assertEqual(len(anomalies), 0)
+
+    # the filters of a QuakeData object are applied before the detection
+    def test_detect_rate_anomalies(self):
+        quake_data = earthquakes.QuakeData(create_random_earthquakes_dictionary(300, 4))
+        anomalies = quake_anomaly.detect_rate_anomalies(quake_data, cell_size=1, bin_seconds=3600)
+        self.assertEqual(anomalies.dtype, quake_anomaly.ANOMALY_DTYPE)
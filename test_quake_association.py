@@ -0,0 +1,201 @@
+from unittest import TestCase
+
+import numpy as np
+
+import earthquakes
+import quake_association
+from test_chunked_quakes import create_random_earthquakes_dictionary
+
+
+def brute_force_pairs(columns, time_tolerance, distance_tolerance):
+    # compare every pair of earthquakes
+    pairs = set()
+    rows = len(columns['time'])
+    for first in range(rows):
+        for second in range(first + 1, rows):
+            if abs(int(columns['time'][first]) - int(columns['time'][second])) > time_tolerance:
+                continue
+            distance = earthquakes.calc_distance(columns['lat'][first], columns['long'][first],
+                                                 columns['lat'][second], columns['long'][second])
+            if distance <= distance_tolerance:
+                pairs.add((first, second))
+    return pairs
+
+
+def all_pairs_within(columns, distance_tolerance):
+    # compare every pair of earthquakes at once (all times are equal)
+    distances = earthquakes.calc_distance_array(columns['lat'][:, None], columns['long'][:, None],
+                                                columns['lat'], columns['long'])
+    first, second = np.nonzero(np.triu(distances <= distance_tolerance, k=1))
+    return set(zip(first.tolist(), second.tolist()))
+
+
+def create_clustered_columns(rows, seed):
+    # earthquakes packed in a small region and time range so there are many pairs, some near the poles
+    # and around the antimeridian
+    rng = np.random.default_rng(seed)
+    lats = np.concatenate((rng.uniform(-10, 10, rows // 2), rng.uniform(80, 90, rows - rows // 2)))
+    if seed % 2:
+        longs = rng.uniform(-180, 180, rows)
+    else:
+        longs = rng.choice([-179.9, 179.9], rows) + rng.normal(0, 1, rows)
+    return {
+        'lat': lats,
+        'long': longs,
+        'time': rng.integers(0, 3_600_000, rows)
+    }
+
+
+class TestFindDuplicatePairs(TestCase):
+
+    # the bucketed sweep should find exactly the pairs of the brute force comparison
+    def test_matches_brute_force(self):
+        for seed in (1, 2):
+            columns = create_clustered_columns(400, seed)
+            first, second = quake_association.find_duplicate_pairs(columns, 120_000, 300)
+            self.assertEqual(set(zip(first.tolist(), second.tolist())),
+                             brute_force_pairs(columns, 120_000, 300))
+
+    # near the poles a pair can be in neighbouring bands with very different numbers of columns
+    def test_matches_brute_force_near_poles(self):
+        for seed in range(4):
+            rng = np.random.default_rng(seed)
+            lats = np.where(rng.random(500) < 0.5, rng.uniform(70, 90, 500), rng.uniform(-90, -70, 500))
+            columns = {'lat': lats, 'long': rng.uniform(-180, 180, 500), 'time': np.zeros(500, dtype=np.int64)}
+            for distance in (100, 300, 1000, 3000):
+                first, second = quake_association.find_duplicate_pairs(columns, 0, distance)
+                self.assertEqual(set(zip(first.tolist(), second.tolist())), all_pairs_within(columns, distance))
+
+    # with very small buckets there are too many of them, only the used ones are numbered
+    def test_small_distance(self):
+        rng = np.random.default_rng(7)
+        centres = rng.uniform(-1, 1, (40, 2))
+        points = np.repeat(centres, 10, axis=0) + rng.normal(0, 0.00005, (400, 2))
+        times = np.repeat(rng.integers(0, 10 ** 11, 40), 10) + rng.integers(0, 1_000_000, 400)
+        columns = {'lat': points[:, 0], 'long': points[:, 1], 'time': times}
+
+        buckets = quake_association.neighbour_buckets(columns['lat'], columns['long'], 0.01)
+        self.assertGreater(int(buckets.max()) * int(np.ptp(times)), 2 ** 62)
+
+        first, second = quake_association.find_duplicate_pairs(columns, 500_000, 0.01)
+        self.assertEqual(set(zip(first.tolist(), second.tolist())), brute_force_pairs(columns, 500_000, 0.01))
+        self.assertGreater(len(first), 0)
+
+    # small pair batches should give the same pairs
+    def test_batches(self):
+        columns = create_clustered_columns(300, 1)
+        expected = quake_association.find_duplicate_pairs(columns, 600_000, 500)
+
+        batch_size = quake_association.PAIR_BATCH_SIZE
+        quake_association.PAIR_BATCH_SIZE = 50
+        try:
+            first, second = quake_association.find_duplicate_pairs(columns, 600_000, 500)
+        finally:
+            quake_association.PAIR_BATCH_SIZE = batch_size
+        np.testing.assert_array_equal(first, expected[0])
+        np.testing.assert_array_equal(second, expected[1])
+
+    # earthquakes with the same id are paired even if they are far apart
+    def test_same_id(self):
+        columns = {'lat': np.array([0.0, 50.0, 0.0]), 'long': np.array([0.0, 50.0, 100.0]),
+                   'time': np.array([0, 10 ** 9, 0]), 'id': np.array(["a", "a", ""])}
+        first, second = quake_association.find_duplicate_pairs(columns)
+        self.assertEqual(list(zip(first.tolist(), second.tolist())), [(0, 1)])
+
+    # pairs outside the magnitude tolerance are discarded
+    def test_magnitude_tolerance(self):
+        columns = {'lat': np.zeros(3), 'long': np.zeros(3), 'time': np.zeros(3, dtype=np.int64),
+                   'magnitude': np.array([4.0, 4.2, 5.5])}
+        first, second = quake_association.find_duplicate_pairs(columns, magnitude_tolerance=0.5)
+        self.assertEqual(list(zip(first.tolist(), second.tolist())), [(0, 1)])
+
+    # earthquakes of the same network with different ids are different events, even if they are close
+    def test_same_network(self):
+        columns = {'lat': np.zeros(4), 'long': np.zeros(4), 'time': np.zeros(4, dtype=np.int64),
+                   'id': np.array(["us1", "us2", "ci1", ""]), 'source': np.array(["us", "us", "ci", "us"])}
+        first, second = quake_association.find_duplicate_pairs(columns)
+        self.assertEqual(list(zip(first.tolist(), second.tolist())), [(0, 2), (0, 3), (1, 2), (1, 3), (2, 3)])
+
+    def test_no_earthquakes(self):
+        first, second = quake_association.find_duplicate_pairs(
+            {'lat': np.empty(0), 'long': np.empty(0), 'time': np.empty(0, dtype=np.int64)})
+        self.assertEqual(len(first), 0)
+
+
+class TestAssociation(TestCase):
+
+    # pairs should be merged transitively into groups named after their smallest row
+    def test_cluster_pairs(self):
+        groups = quake_association.cluster_pairs(7, np.array([5, 1, 3, 2]), np.array([6, 3, 4, 0]))
+        np.testing.assert_array_equal(groups, [0, 1, 0, 1, 1, 5, 5])
+
+    # a long chain of pairs should end up in a single group
+    def test_cluster_chain(self):
+        rows = 1000
+        groups = quake_association.cluster_pairs(rows, np.arange(rows - 1)[::-1], np.arange(1, rows)[::-1])
+        self.assertTrue(np.all(groups == 0))
+
+    # an earthquake is grouped with its seed, groups are not chained through other earthquakes
+    def test_seed_groups(self):
+        first, second = np.arange(4), np.arange(1, 5)
+        np.testing.assert_array_equal(quake_association.seed_groups(6, first, second, np.arange(6)), [0, 0, 2, 2, 4, 5])
+        np.testing.assert_array_equal(quake_association.seed_groups(6, first, second, np.array([1, 3, 0, 2, 4, 5])),
+                                      [1, 1, 1, 3, 3, 5])
+
+    # a sequence of close events of one network must stay intact, only the copies of another network are merged
+    def test_same_network_sequence(self):
+        rows = 1000
+        rng = np.random.default_rng(8)
+        columns = {'lat': 10 + np.arange(rows) * 0.0009, 'long': np.full(rows, 20.0),
+                   'time': np.arange(rows) * 10_000, 'id': np.array([f"us{i}" for i in range(rows)]),
+                   'source': np.full(rows, "us"), 'significance': rng.integers(0, 1000, rows)}
+
+        groups, rows_kept = quake_association.associate(columns)
+        self.assertEqual(len(rows_kept), rows)
+
+        # another network reports the first 100 events 1 second later
+        copies = {'lat': columns['lat'][:100] + 0.001, 'long': columns['long'][:100],
+                  'time': columns['time'][:100] + 1000, 'id': np.array([f"ci{i}" for i in range(100)]),
+                  'source': np.full(100, "ci"), 'significance': np.zeros(100, dtype=np.int64)}
+        merged = {column: np.concatenate((columns[column], copies[column])) for column in columns}
+        groups, rows_kept = quake_association.associate(merged, source_priority=["us"])
+        np.testing.assert_array_equal(rows_kept, np.arange(rows))
+
+    # the preferred source is kept, then the most significant earthquake
+    def test_preferred_rows(self):
+        columns = {'significance': np.array([10, 500, 300, 50, 60]),
+                   'source': np.array(["ci", "us", "ci", "nc", "nc"])}
+        groups = np.array([0, 0, 0, 3, 3])
+        np.testing.assert_array_equal(quake_association.preferred_rows(columns, groups, ["ci", "us"]), [2, 4])
+        np.testing.assert_array_equal(quake_association.preferred_rows(columns, groups), [1, 4])
+
+    # the same events reported by two networks should be merged keeping the preferred network
+    def test_deduplicate_quake_data(self):
+        dictionary = create_random_earthquakes_dictionary(50, 5)
+        for feature in dictionary['features']:
+            feature['properties']['net'] = "us"
+
+        # a regional network reports the first 20 events slightly differently
+        rng = np.random.default_rng(6)
+        for i, feature in enumerate(dictionary['features'][:20]):
+            copy = {
+                "type": "Feature",
+                "properties": dict(feature['properties'], net="ci", time=feature['properties']['time'] + 1500,
+                                   mag=feature['properties']['mag'] + 0.1),
+                "geometry": {"type": "Point",
+                             "coordinates": [c + float(rng.uniform(-0.05, 0.05)) for c in
+                                             feature['geometry']['coordinates']]},
+                "id": f"ci{i}"
+            }
+            dictionary['features'].append(copy)
+
+        quake_data = earthquakes.QuakeData(dictionary)
+        self.assertEqual(quake_data.quake_array['quake'][0].id, "test5_0")
+        self.assertEqual(quake_data.quake_array['quake'][0].source, "us")
+
+        deduplicated = quake_association.deduplicate(quake_data, time_tolerance=5_000, distance_tolerance=20,
+                                                     source_priority=["ci"])
+        quakes = deduplicated.quake_array['quake']
+        self.assertEqual(len(quakes), 50)
+        self.assertEqual(sorted(quake.id for quake in quakes if quake.source == "ci"),
+                         sorted(f"ci{i}" for i in range(20)))
@@ -0,0 +1,96 @@
+import json
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+import earthquakes
+import quake_columnar
+import quake_filters
+from test_chunked_quakes import create_random_earthquakes_dictionary
+
+
+class TestColumnarFormats(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.quake_data = earthquakes.QuakeData(create_random_earthquakes_dictionary(500, 3))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def assert_round_trip(self, file_format):
+        path = Path(self.temp_dir.name) / f"quakes.{file_format}"
+        self.assertEqual(quake_columnar.export_quake_data(self.quake_data, path, file_format), file_format)
+
+        loaded = quake_columnar.import_quake_data(path)
+        for column in earthquakes.QUAKE_COLUMNS:
+            if earthquakes.QUAKE_COLUMNS[column] is np.str_:
+                continue
+            self.assertEqual(loaded.quake_array[column].dtype, self.quake_data.quake_array[column].dtype)
+            np.testing.assert_array_equal(loaded.quake_array[column], self.quake_data.quake_array[column])
+        self.assertEqual(str(loaded.quake_array['quake'][7]), str(self.quake_data.quake_array['quake'][7]))
+        self.assertEqual(loaded.quake_array['quake'][7].q_type, "earthquake")
+        self.assertEqual(loaded.quake_array['quake'][7].id, "test3_7")
+
+    def test_numpy_round_trip(self):
+        self.assert_round_trip("numpy")
+
+    @unittest.skipIf(quake_columnar.pyarrow is None, "pyarrow is not installed")
+    def test_arrow_round_trip(self):
+        self.assert_round_trip("arrow")
+
+    # numpy columns are read in place from a memory map
+    def test_numpy_columns_are_zero_copy(self):
+        path = Path(self.temp_dir.name) / "quakes.numpy"
+        quake_columnar.export_quake_data(self.quake_data, path, "numpy")
+
+        columns = quake_columnar.import_columns(path)
+        self.assertFalse(columns['magnitude'].flags.owndata)
+        self.assertFalse(columns['magnitude'].flags.writeable)
+        self.assertEqual(columns['magnitude'].ctypes.data % quake_columnar.ALIGNMENT, 0)
+
+    # ids are unique, they are stored as bytes instead of categories in the header
+    def test_numpy_id_column(self):
+        path = Path(self.temp_dir.name) / "quakes.numpy"
+        columns = quake_columnar.to_columns(self.quake_data)
+        columns['id'] = np.array([f"évent_{i}" for i in range(len(columns['id']))], dtype=np.str_)
+        quake_columnar.write_numpy_columns(path, columns)
+
+        with open(path, "rb") as file:
+            file.read(len(quake_columnar.NUMPY_MAGIC))
+            header = json.loads(file.read(struct.unpack("<Q", file.read(8))[0]))
+        header_columns = {column['name']: column for column in header['columns']}
+        self.assertNotIn('categories', header_columns['id'])
+        self.assertIn('categories', header_columns['source'])
+
+        loaded = quake_columnar.read_numpy_columns(path)
+        np.testing.assert_array_equal(loaded['id'], columns['id'])
+        np.testing.assert_array_equal(loaded['source'], columns['source'])
+        np.testing.assert_array_equal(loaded['q_type'], columns['q_type'])
+
+    # filtered results and empty results can be exported too
+    def test_export_filtered_array(self):
+        path = Path(self.temp_dir.name) / "filtered.numpy"
+        filtered_array = self.quake_data.query(quake_filters.PropertyFilter(magnitude=5))
+        quake_columnar.export_quake_data(filtered_array, path, "numpy")
+        self.assertEqual(len(quake_columnar.import_quake_data(path).quake_array), len(filtered_array))
+
+        empty_array = self.quake_data.query(quake_filters.PropertyFilter(magnitude=100))
+        quake_columnar.export_quake_data(empty_array, path, "numpy")
+        self.assertEqual(len(quake_columnar.import_quake_data(path).quake_array), 0)
+
+    def test_invalid_file(self):
+        path = Path(self.temp_dir.name) / "quakes.txt"
+        path.write_text("not columnar")
+        with self.assertRaises(ValueError):
+            quake_columnar.import_columns(path)
+
+    # columnar files should be smaller than geojson
+    def test_compare_with_geojson(self):
+        results = quake_columnar.compare_with_geojson(self.quake_data, self.temp_dir.name)
+        self.assertLess(results['numpy']['bytes'], results['geojson']['bytes'])
+        self.assertIn('read_seconds', results['numpy'])
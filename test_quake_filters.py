@@ -0,0 +1,228 @@
+from unittest import TestCase
+
+import numpy as np
+
+import earthquakes
+import quake_filters
+from test_earthquakes import create_only_10_earthquakes_dictionary
+
+
+class TestQuakeFilters(TestCase):
+
+    # filters with the same values are equal and can be used as dictionary keys
+    def test_filters_are_hashable_and_immutable(self):
+        first = quake_filters.LocationFilter(10, "20", 30) & quake_filters.PropertyFilter(magnitude=2)
+        second = quake_filters.LocationFilter(10.0, 20, 30) & quake_filters.PropertyFilter(2, None, None)
+        self.assertEqual(first, second)
+        self.assertEqual(len({first: 1, second: 2}), 1)
+
+        with self.assertRaises(AttributeError):
+            first.filters = ()
+
+    def test_invalid_filters(self):
+        with self.assertRaises(ValueError):
+            quake_filters.LocationFilter("lat", 0, 10)
+        with self.assertRaises(ValueError):
+            quake_filters.PropertyFilter()
+        with self.assertRaises(ValueError):
+            quake_filters.TimeFilter()
+
+    # and / or combinations should match the boolean combination of the masks
+    def test_and_or_filters(self):
+        quake_array = earthquakes.QuakeData(create_only_10_earthquakes_dictionary()).quake_array
+        quake_array['magnitude'] = np.arange(10)
+        quake_array['time'] = np.arange(10) * 1000
+
+        strong = quake_filters.PropertyFilter(magnitude=5)
+        early = quake_filters.TimeFilter(end=2000)
+
+        np.testing.assert_array_equal((strong & early).mask(quake_array), np.zeros(10, dtype=bool))
+        np.testing.assert_array_equal(np.flatnonzero((strong | early).mask(quake_array)), [0, 1, 2, 5, 6, 7, 8, 9])
+        np.testing.assert_array_equal(np.flatnonzero((strong & quake_filters.TimeFilter(6000, 8000)).mask(quake_array)),
+                                      [6, 7, 8])
+
+
+def create_grid_columns(step=1.0):
+    """This function will create columns with one point every step degrees"""
+    lats, longs = np.meshgrid(np.arange(-30, 30, step) + step / 2, np.arange(-30, 30, step) + step / 2,
+                              indexing='ij')
+    return {'lat': lats.ravel(), 'long': longs.ravel()}
+
+
+class TestSpatialFilters(TestCase):
+
+    def test_bbox_filter(self):
+        columns = {'lat': np.array([0, 5, 10, 5]), 'long': np.array([0, 175, 0, -175])}
+        np.testing.assert_array_equal(quake_filters.BBoxFilter(-1, -1, 6, 176).mask(columns),
+                                      [True, True, False, False])
+
+        # crossing the antimeridian
+        np.testing.assert_array_equal(quake_filters.BBoxFilter(0, 170, 6, -170).mask(columns),
+                                      [False, True, False, True])
+
+    # a square with a square hole, with and without the grid
+    def test_polygon_with_hole(self):
+        columns = create_grid_columns(0.5)
+        square = [(-10, -10), (-10, 10), (10, 10), (10, -10)]
+        hole = [(-5, -5), (-5, 5), (5, 5), (5, -5)]
+
+        expected = ((np.abs(columns['lat']) < 10) & (np.abs(columns['long']) < 10) &
+                    ~((np.abs(columns['lat']) < 5) & (np.abs(columns['long']) < 5)))
+
+        for grid_size in (None, 4, 64):
+            polygon = quake_filters.PolygonFilter(square, holes=[hole], grid_size=grid_size)
+            np.testing.assert_array_equal(polygon.mask(columns), expected)
+
+    # the grid must give the same result as testing all the edges on a detailed polygon
+    def test_polygon_grid_matches_exact_test(self):
+        rng = np.random.default_rng(0)
+        columns = {'lat': rng.uniform(-40, 40, 20_000), 'long': rng.uniform(-40, 40, 20_000)}
+        angles = np.linspace(0, 2 * np.pi, 500, endpoint=False)
+        radius = 20 + 8 * np.sin(7 * angles)
+        star = list(zip(radius * np.cos(angles), radius * np.sin(angles)))
+
+        exact = quake_filters.PolygonFilter(star, grid_size=None).mask(columns)
+        self.assertGreater(exact.sum(), 0)
+        for grid_size in (1, 32, 'auto'):
+            np.testing.assert_array_equal(quake_filters.PolygonFilter(star, grid_size=grid_size).mask(columns), exact)
+
+    # jagged polygons have long edges going through many rows of the grid
+    def test_jagged_polygon_grid_matches_exact_test(self):
+        for seed in range(3):
+            rng = np.random.default_rng(seed)
+            columns = {'lat': rng.uniform(-20, 20, 10_000), 'long': rng.uniform(-20, 20, 10_000)}
+            angles = np.linspace(0, 2 * np.pi, 1000, endpoint=False)
+            radius = 10 * (1 + 0.6 * rng.uniform(-1, 1, 1000))
+            jagged = np.column_stack((radius * np.cos(angles), radius * np.sin(angles)))
+            hole = np.column_stack((2 * np.cos(angles[::50]), 2 * np.sin(angles[::50])))
+
+            exact = quake_filters.PolygonFilter(jagged, [hole], grid_size=None).mask(columns)
+            for grid_size in (7, 'auto'):
+                np.testing.assert_array_equal(
+                    quake_filters.PolygonFilter(jagged, [hole], grid_size=grid_size).mask(columns), exact)
+
+    # a polygon crossing the antimeridian should match the same polygon moved away from it
+    def test_polygon_across_antimeridian(self):
+        moved = create_grid_columns(0.5)
+        columns = {'lat': moved['lat'], 'long': (moved['long'] + 360) % 360 - 180}
+        square = [(-10, 170), (-10, -170), (10, -170), (10, 170)]
+        hole = [(-5, 175), (-5, -175), (5, -175), (5, 175)]
+
+        expected = quake_filters.PolygonFilter([(-10, -10), (-10, 10), (10, 10), (10, -10)],
+                                               holes=[[(-5, -5), (-5, 5), (5, 5), (5, -5)]]).mask(moved)
+        self.assertGreater(expected.sum(), 0)
+        for grid_size in (None, 4, 'auto'):
+            polygon = quake_filters.PolygonFilter(square, holes=[hole], grid_size=grid_size)
+            np.testing.assert_array_equal(polygon.mask(columns), expected)
+
+        polygon = quake_filters.PolygonFilter(square, holes=[hole])
+        self.assertTrue(polygon.may_match({'lat': [0, 1], 'long': [-175, -172]}))
+        self.assertTrue(polygon.may_match({'lat': [0, 1], 'long': [172, 175]}))
+        self.assertFalse(polygon.may_match({'lat': [0, 1], 'long': [-160, 160]}))
+
+    # a ring going around the whole globe is used as given
+    def test_polygon_around_pole(self):
+        columns = {'lat': np.array([70, 70, 50]), 'long': np.array([-179, 179, 0])}
+        cap = quake_filters.PolygonFilter([(60, -180), (60, 0), (60, 180), (90, 180), (90, -180)])
+        np.testing.assert_array_equal(cap.mask(columns), [True, True, False])
+
+    def test_multipolygon_filter(self):
+        columns = {'lat': np.array([1, 11, 5]), 'long': np.array([1, 11, 5])}
+        multipolygon = quake_filters.MultiPolygonFilter([
+            ([(0, 0), (0, 2), (2, 2), (2, 0)],),
+            ([(10, 10), (10, 12), (12, 12), (12, 10)],)
+        ])
+        np.testing.assert_array_equal(multipolygon.mask(columns), [True, True, False])
+
+    # distance to a polyline should agree with the haversine distance to its closest point
+    def test_corridor_filter(self):
+        corridor = quake_filters.CorridorFilter([(0, 0), (0, 2), (1, 3)], width=50)
+        columns = {'lat': np.array([0.3, 0.5, 0.0, 1.2, -0.5]), 'long': np.array([1.0, 1.0, -0.4, 3.1, -0.1])}
+
+        # 33 and 56 kms from the first segment
+        self.assertLess(earthquakes.calc_distance(0.3, 1.0, 0, 1.0), 50)
+        self.assertGreater(earthquakes.calc_distance(0.5, 1.0, 0, 1.0), 50)
+
+        np.testing.assert_array_equal(corridor.mask(columns), [True, False, True, True, False])
+
+    # a polyline crossing the antimeridian takes the short way around
+    def test_corridor_across_antimeridian(self):
+        corridor = quake_filters.CorridorFilter([(0, 179), (0, -179)], width=50)
+        columns = {'lat': np.array([0.2, 0.2, 0.2, 0.2, 0.2]), 'long': np.array([179.5, -179.5, 180, 0, -178.7])}
+        distances = [earthquakes.calc_distance(0.2, -178.7, 0, -179), earthquakes.calc_distance(0.2, 179.5, 0, 179.5)]
+        self.assertTrue(all(distance < 50 for distance in distances))
+        np.testing.assert_array_equal(corridor.mask(columns), [True, True, True, False, True])
+        self.assertTrue(corridor.may_match({'lat': [0, 1], 'long': [-179.2, -179]}))
+        self.assertFalse(corridor.may_match({'lat': [0, 1], 'long': [-170, 170]}))
+
+        # the width can also reach past the antimeridian
+        corridor = quake_filters.CorridorFilter([(0, 170), (0, 179.9)], width=50)
+        np.testing.assert_array_equal(corridor.mask({'lat': np.array([0.0, 0.0]), 'long': np.array([-179.9, 0])}),
+                                      [True, False])
+
+    # region filters can be set on QuakeData and combined with the other filters
+    def test_quake_data_region_filter(self):
+        quake_data = earthquakes.QuakeData(create_only_10_earthquakes_dictionary())
+        quake_data.set_region_filter(quake_filters.BBoxFilter(99, 99, 101, 101))
+        self.assertEqual(len(quake_data.get_filtered_array()), 10)
+
+        quake_data.set_property_filter(magnitude=3)
+        self.assertEqual(len(quake_data.get_filtered_array()), 0)
+
+        quake_data.clear_filter()
+        quake_data.set_region_filter(quake_filters.PolygonFilter([(0, 0), (0, 1), (1, 1)]))
+        self.assertEqual(len(quake_data.get_filtered_array()), 0)
+
+        with self.assertRaises(ValueError):
+            quake_data.set_region_filter((0, 0, 1, 1))
+
+
+class TestDepthFilters(TestCase):
+
+    # at the surface the 3D distance is the chord, close to the haversine distance for short distances
+    def test_hypocentral_distance(self):
+        self.assertAlmostEqual(float(earthquakes.calc_hypocentral_distance_array(10, 20, 0, 10, 20, 15)), 15)
+        surface = earthquakes.calc_distance(10, 20, 10.1, 20.1)
+        self.assertAlmostEqual(float(earthquakes.calc_hypocentral_distance_array(10, 20, 0, 10.1, 20.1, 0)),
+                               surface, places=3)
+
+        # straight line between a point 3 kms away at the surface and 4 kms deep
+        lat_offset = np.degrees(3 / earthquakes.EARTH_RADIUS_KM)
+        self.assertAlmostEqual(float(earthquakes.calc_hypocentral_distance_array(0, 0, 0, lat_offset, 0, 4)), 5,
+                               places=2)
+
+    def test_quake_keeps_depth(self):
+        quake_data = earthquakes.QuakeData(create_only_10_earthquakes_dictionary())
+        np.testing.assert_array_equal(quake_data.quake_array['depth'], 0.1)
+        self.assertEqual(quake_data.quake_array['quake'][0].depth, 0.1)
+        self.assertAlmostEqual(quake_data.quake_array['quake'][0].get_hypocentral_distance_from(100, 100, 10.1), 10)
+
+    # depth filters combine with the location and property filters
+    def test_depth_and_hypocentral_filters(self):
+        columns = {'lat': np.zeros(4), 'long': np.zeros(4), 'depth': np.array([1.0, 5.0, 12.0, 40.0]),
+                   'magnitude': np.array([1.0, 2.0, 3.0, 4.0]), 'felt': np.zeros(4), 'significance': np.zeros(4)}
+
+        np.testing.assert_array_equal(quake_filters.DepthFilter(2, 20).mask(columns), [False, True, True, False])
+        np.testing.assert_array_equal(quake_filters.HypocentralFilter(0, 0, 3, 9).mask(columns),
+                                      [True, True, True, False])
+
+        combined = quake_filters.HypocentralFilter(0, 0, 3, 9) & quake_filters.PropertyFilter(magnitude=2)
+        np.testing.assert_array_equal(combined.mask(columns), [False, True, True, False])
+
+        self.assertFalse(quake_filters.HypocentralFilter(0, 0, 0, 10).may_match(
+            {'lat': [1, 2], 'depth': [0, 5]}))
+        self.assertFalse(quake_filters.DepthFilter(max_depth=10).may_match({'depth': [11, 20]}))
+
+    def test_quake_data_depth_filters(self):
+        quake_data = earthquakes.QuakeData(create_only_10_earthquakes_dictionary())
+        quake_data.set_depth_filter(max_depth=1)
+        quake_data.set_hypocentral_filter(100, 100, 0, 1)
+        self.assertEqual(len(quake_data.get_filtered_array()), 10)
+
+        quake_data.set_depth_filter(min_depth=1)
+        self.assertEqual(len(quake_data.get_filtered_array()), 0)
+
+        quake_data.clear_filter()
+        self.assertIsNone(quake_data.depth_filter)
+        with self.assertRaises(ValueError):
+            quake_data.set_hypocentral_filter(100, 100, "deep", 1)
@@ -0,0 +1,132 @@
+import contextlib
+import http.client
+import io
+import json
+import urllib.error
+import urllib.request
+from unittest import TestCase
+
+import earthquakes
+import quake_filters
+import quake_load_test
+import quake_server
+from test_chunked_quakes import create_random_earthquakes_dictionary
+
+
+def get_json(url):
+    """This function will send a GET request and decode the json answer"""
+    with urllib.request.urlopen(url) as response:
+        return json.loads(response.read())
+
+
+class TestQuakeServer(TestCase):
+
+    def setUp(self):
+        self.quake_data = earthquakes.QuakeData(create_random_earthquakes_dictionary(300, 1))
+        self.server = quake_server.QuakeServer(self.quake_data).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    # filters come from the request and match the QuakeData query
+    def test_filtered_quakes(self):
+        answer = get_json(self.server.url + "/quakes?lat=10&lon=20&distance=5000&magnitude=2&limit=5")
+        expected = self.quake_data.query(quake_filters.LocationFilter(10, 20, 5000) & quake_filters.PropertyFilter(2))
+
+        self.assertEqual(answer['count'], len(expected))
+        self.assertLessEqual(len(answer['quakes']), 5)
+
+    # the filters set on the served QuakeData are not used
+    def test_quake_data_filters_are_ignored(self):
+        self.quake_data.set_property_filter(magnitude=100)
+        self.quake_data.set_location_filter(10, 20, 1)
+        self.assertEqual(len(self.quake_data.get_filtered_array()), 0)
+
+        self.assertEqual(get_json(self.server.url + "/health")['count'], 300)
+        self.assertEqual(get_json(self.server.url + "/quakes")['count'], 300)
+        self.assertEqual(get_json(self.server.url + "/stats")['count'], 300)
+
+    def test_stats_and_aggregate(self):
+        stats = get_json(self.server.url + "/stats?significance=500")
+        self.assertEqual(stats['count'], len(self.quake_data.query(quake_filters.PropertyFilter(significance=500))))
+
+        aggregate = get_json(self.server.url + "/aggregate")
+        self.assertEqual(sum(count for _, count in aggregate['counts']), 300)
+
+    # invalid filters are rejected with a 400
+    def test_invalid_filter(self):
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            get_json(self.server.url + "/quakes?lat=10&lon=abc&distance=10")
+        self.assertEqual(context.exception.code, 400)
+
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            get_json(self.server.url + "/quakes?lat=10")
+        self.assertEqual(context.exception.code, 400)
+
+    # distinct float parameters should not grow the cached results past the budget
+    def test_cache_is_bounded(self):
+        with quake_server.QuakeServer(self.quake_data, cache_bytes=20_000) as server:
+            for i in range(50):
+                get_json(server.url + f"/stats?magnitude={i / 1000}")
+            self.assertLessEqual(server.snapshot._cache_nbytes, 20_000)
+            self.assertLess(len(server.snapshot._cache), 50)
+
+            server.add_events(earthquakes.QuakeData(create_random_earthquakes_dictionary(10, 2)))
+            self.assertEqual(server.snapshot.cache_bytes, 20_000)
+
+    # the health check does not parse the filters
+    def test_health_ignores_filters(self):
+        self.assertEqual(get_json(self.server.url + "/health?lat=abc&magnitude=")['count'], 300)
+
+    # unexpected errors are answered with a 500 and the keep alive connection stays usable
+    def test_internal_error(self):
+        def cached_query(quake_filter=None):
+            raise RuntimeError("broken cache")
+
+        self.server.snapshot.cached_query = cached_query
+        connection = http.client.HTTPConnection(*self.server._server.server_address[:2])
+        errors = io.StringIO()
+        try:
+            with contextlib.redirect_stderr(errors):
+                connection.request("GET", "/quakes")
+                response = connection.getresponse()
+                self.assertEqual(response.status, 500)
+                self.assertEqual(json.loads(response.read()), {'error': "Internal server error"})
+
+            connection.request("GET", "/health")
+            response = connection.getresponse()
+            self.assertEqual(response.status, 200)
+            self.assertEqual(json.loads(response.read())['count'], 300)
+        finally:
+            connection.close()
+        self.assertIn("broken cache", errors.getvalue())
+
+    # new events are swapped in while old snapshots stay unchanged
+    def test_add_events(self):
+        old_snapshot = self.server.snapshot
+        body = json.dumps(create_random_earthquakes_dictionary(10, 2)).encode()
+        request = urllib.request.Request(self.server.url + "/events", data=body, method="POST")
+        with urllib.request.urlopen(request) as response:
+            answer = json.loads(response.read())
+
+        self.assertEqual(answer, {'added': 10, 'count': 310})
+        self.assertEqual(len(old_snapshot.quake_array), 300)
+        self.assertEqual(get_json(self.server.url + "/health")['count'], 310)
+
+    # malformed events are rejected with a 400, without printing from the request thread
+    def test_add_invalid_events(self):
+        request = urllib.request.Request(self.server.url + "/events", data=b'{"features": ["bad"]}', method="POST")
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen(request)
+
+        self.assertEqual(context.exception.code, 400)
+        self.assertEqual(output.getvalue(), "")
+        self.assertEqual(get_json(self.server.url + "/health")['count'], 300)
+
+    # the load test reports latencies and throughput
+    def test_load_test(self):
+        results = quake_load_test.load_test(self.server.url, clients=4, requests=10)
+        self.assertEqual(results['requests'], 40)
+        self.assertEqual(results['errors'], 0)
+        self.assertLessEqual(results['p50_ms'], results['p99_ms'])
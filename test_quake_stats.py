@@ -0,0 +1,102 @@
+from unittest import TestCase
+
+import numpy as np
+
+import quake_stats
+
+
+class TestExactQuantiles(TestCase):
+
+    # exact quantiles should match numpy's sort based percentiles
+    def test_quantiles_match_numpy(self):
+        values = np.random.default_rng(1).normal(2, 1.5, 1001)
+        percentiles = [0, 1, 25, 50, 75, 99.9, 100]
+        np.testing.assert_allclose(quake_stats.exact_quantiles(values, percentiles),
+                                   np.percentile(values, percentiles))
+
+    # the median of an even number of values is the mean of the two middle values
+    def test_median_even_number_of_values(self):
+        self.assertEqual(quake_stats.median([4.0, 1.0, 3.0, 2.0]), 2.5)
+
+    # the input must not be reordered unless overwrite_input is requested
+    def test_input_is_not_modified_by_default(self):
+        values = np.array([5.0, 1.0, 4.0, 2.0, 3.0])
+        quake_stats.median(values)
+        np.testing.assert_array_equal(values, [5.0, 1.0, 4.0, 2.0, 3.0])
+
+        self.assertEqual(quake_stats.median(values, overwrite_input=True), 3.0)
+        self.assertEqual(values[2], 3.0)
+
+    # views such as a column of a structured array must not be reordered
+    def test_views_are_not_modified(self):
+        rows = np.zeros(5, dtype=[('magnitude', np.float64), ('time', np.int64)])
+        rows['magnitude'] = [5.0, 1.0, 4.0, 2.0, 3.0]
+        rows['time'] = [50, 10, 40, 20, 30]
+
+        self.assertEqual(quake_stats.median(rows['magnitude'], overwrite_input=True), 3.0)
+        np.testing.assert_array_equal(rows['magnitude'], [5.0, 1.0, 4.0, 2.0, 3.0])
+        np.testing.assert_array_equal(rows['time'] / 10, rows['magnitude'])
+
+    # nan values give nan, like np.median
+    def test_nan_values(self):
+        self.assertTrue(np.isnan(quake_stats.exact_quantiles([1, np.nan, 3], 50)))
+        self.assertTrue(np.all(np.isnan(quake_stats.exact_quantiles([1, np.nan, 3], [0, 100]))))
+
+    # percentiles outside of [0, 100] are invalid
+    def test_invalid_percentile(self):
+        with self.assertRaises(ValueError):
+            quake_stats.exact_quantiles([1, 2, 3], 101)
+
+
+class TestMagnitudeMode(TestCase):
+
+    # negative magnitudes are valid and must be counted
+    def test_mode_with_negative_magnitudes(self):
+        self.assertEqual(quake_stats.magnitude_mode([-1.2, -0.9, -1.1, 2.0, 0.2]), -1)
+
+    # chunked counts should give the same mode as the whole array
+    def test_mode_counter_merge(self):
+        first = quake_stats.ModeCounter()
+        first.update([-0.7, -1.0, 3.2])
+        second = quake_stats.ModeCounter()
+        second.update([-1.3, 4.1])
+        self.assertEqual(first.merge(second).mode(), -1)
+
+
+class TestQuantileSketch(TestCase):
+
+    # estimated percentiles should be within a small rank error of the exact ones
+    def test_sketch_rank_error(self):
+        values = np.random.default_rng(2).normal(1, 2, 200_000)
+        sketch = quake_stats.QuantileSketch(k=200, seed=3)
+        for chunk in np.array_split(values, 37):
+            sketch.update(chunk)
+
+        sorted_values = np.sort(values)
+        for percentile in [1, 10, 50, 90, 99]:
+            estimate = sketch.quantiles(percentile)
+            rank = np.searchsorted(sorted_values, estimate) / len(values) * 100
+            self.assertAlmostEqual(rank, percentile, delta=2)
+
+        self.assertEqual(sketch.count, len(values))
+        self.assertEqual(sketch.quantiles(0), values.min())
+        self.assertEqual(sketch.quantiles(100), values.max())
+
+    # merging sketches built on separate chunks should summarise the union of the chunks
+    def test_sketch_merge(self):
+        rng = np.random.default_rng(4)
+        first_values = rng.uniform(-2, 0, 50_000)
+        second_values = rng.uniform(0, 2, 50_000)
+
+        first = quake_stats.QuantileSketch(seed=5)
+        first.update(first_values)
+        second = quake_stats.QuantileSketch(seed=6)
+        second.update(second_values)
+        first.merge(second)
+
+        self.assertEqual(first.count, 100_000)
+        self.assertAlmostEqual(first.median(), 0, delta=0.1)
+
+    # an empty sketch has no percentiles
+    def test_empty_sketch(self):
+        self.assertTrue(np.isnan(quake_stats.QuantileSketch().median()))